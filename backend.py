@@ -1,11 +1,20 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 import os
+import json
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv, find_dotenv
 
 # Import your existing RAG and LLM logic
 # Ensure rag_query.py is in the same directory or its path is correctly configured
-from rag_query import TOGETHER_API_KEY, DB_FAISS_PATH, get_vectorstore_instance, get_dsa_agent
+from rag_query import TOGETHER_API_KEY, TOGETHER_MODEL_ID, DB_FAISS_PATH, get_vectorstore_instance, get_dsa_agent, AgentEventCallbackHandler, load_llm, get_reranker
+from chat_sessions import SessionStore
+from tracing import TracingCallbackHandler, render_metrics, trace_request
+from batch_answer import BATCH_MAX_QUERIES, BatchAnswerer, normalize_items
 
 # Load environment variables
 load_dotenv(find_dotenv())
@@ -18,21 +27,56 @@ CORS(app, origins=["https://dsa-rag.vercel.app/"])
 # --- Initialize your DSA resources (similar to Streamlit's @st.cache_resource) ---
 # This part runs when the Flask app starts.
 dsa_agent_instance = None
+vectorstore_instance = None
+batch_answerer = None
+batch_answerer_lock = threading.Lock()
+
+# "eager" loads everything at import. Under gunicorn.conf.py (preload_app) that happens
+# once in the master and the forked workers share the loaded model and index
+# copy-on-write. "background" loads in a thread so the server accepts connections right
+# away; /readyz reports when it is done. Threads do not survive fork(), so under gunicorn
+# each worker starts its own loader (post_fork in gunicorn.conf.py) and loads separately.
+BACKEND_INIT_MODE = os.environ.get("BACKEND_INIT_MODE", "eager")
+startup_status = {"state": "starting", "seconds": None}
+_startup_lock = threading.Lock()
+_startup_pid = None
+
+# Streaming runs execute on this pool; the request thread only relays events, so a
+# slow agent run never blocks a whole worker process.
+STREAM_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.environ.get("AGENT_STREAM_WORKERS", 8)))
+SSE_KEEPALIVE_SECONDS = 15
+
+# Conversation history is kept server-side per session id. The agent sees a rolling
+# summary plus the latest turns within CHAT_HISTORY_TOKEN_BUDGET tokens, so the prompt
+# stays about the same size however long the conversation gets. Set CHAT_SESSION_PATH
+# to a SQLite file when running more than one gunicorn worker.
+chat_sessions = SessionStore(
+    llm=load_llm(TOGETHER_MODEL_ID),
+    token_budget=int(os.environ.get("CHAT_HISTORY_TOKEN_BUDGET", 1500)),
+    summary_tokens=int(os.environ.get("CHAT_SUMMARY_TOKENS", 300)),
+    ttl_seconds=int(os.environ.get("CHAT_SESSION_TTL", 24 * 3600)),
+    path=os.environ.get("CHAT_SESSION_PATH") or None,
+)
 
 def initialize_dsa_resources():
-    global dsa_agent_instance
+    global dsa_agent_instance, vectorstore_instance
     if dsa_agent_instance is None:
         if TOGETHER_API_KEY is None:
             print("Error: TOGETHER_API_KEY environment variable is not set.")
             return None
         try:
-            vectorstore_db = get_vectorstore_instance()
+            # The reranker model loads alongside the embedding model and index.
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                reranker_future = executor.submit(get_reranker)
+                vectorstore_db = get_vectorstore_instance()
+                reranker_future.exception()  # a failure is reported by get_dsa_agent below
             if vectorstore_db is None:
                 print(f"Failed to load DSA knowledge base from {DB_FAISS_PATH}.")
                 return None
         except Exception as e:
             print(f"Initialization Error: Could not load the DSA knowledge base. Details: {e}")
             return None
+        vectorstore_instance = vectorstore_db
         try:
             dsa_agent_instance = get_dsa_agent(vectorstore_db)
         except Exception as e:
@@ -40,23 +84,70 @@ def initialize_dsa_resources():
             return None
     return dsa_agent_instance
 
-# Initialize when app starts
-with app.app_context():
-    initialize_dsa_resources()
+def startup():
+    start = time.perf_counter()
+    with app.app_context():
+        initialize_dsa_resources()
+    startup_status["seconds"] = round(time.perf_counter() - start, 2)
     if dsa_agent_instance:
-        print("DSA agent initialized successfully.")
+        startup_status["state"] = "ready"
+        print(f"DSA agent initialized successfully in {startup_status['seconds']}s.")
     else:
+        startup_status["state"] = "failed"
         print("DSA agent initialization failed. Check your environment variables and FAISS path.")
 
+def start_background_startup():
+    """Starts the loader thread in this process, unless it already runs here or loading is over."""
+    global _startup_pid
+    with _startup_lock:
+        if _startup_pid == os.getpid() or startup_status["state"] != "starting":
+            return
+        _startup_pid = os.getpid()
+    threading.Thread(target=startup, name="dsa-startup", daemon=True).start()
+
+# Initialize when app starts. A gunicorn master preloading the app must not start the
+# loader thread: its workers would be forked without it and stay "starting" for good.
+if BACKEND_INIT_MODE == "background":
+    if "gunicorn" not in sys.modules:
+        start_background_startup()
+else:
+    startup()
+
+
+def not_ready_response():
+    if BACKEND_INIT_MODE == "background":
+        start_background_startup()  # a worker whose server config did not start it
+    if startup_status["state"] == "starting":
+        return jsonify({"output": "Backend is still starting. Please try again in a moment."}), 503
+    return jsonify({"output": "Backend not fully initialized. Please check server logs."}), 500
+
 
 @app.route('/')
 def index():
     return "Backend is running. Access the frontend via index.html"
 
+@app.route('/healthz')
+def healthz():
+    # Liveness: the process is up and serving requests.
+    return jsonify({"status": "ok"})
+
+@app.route('/readyz')
+def readyz():
+    # Readiness: the knowledge base and agent are loaded and /chat can answer.
+    if BACKEND_INIT_MODE == "background":
+        start_background_startup()
+    status_code = 200 if startup_status["state"] == "ready" else 503
+    return jsonify({"status": startup_status["state"], "startup_seconds": startup_status["seconds"]}), status_code
+
+@app.route('/metrics')
+def metrics():
+    # Prometheus text format; per-stage latency histograms, token and cache counters (all workers, see tracing.METRICS_PATH).
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/chat', methods=['POST'])
 def chat():
     if not dsa_agent_instance:
-        return jsonify({"output": "Backend not fully initialized. Please check server logs."}), 500
+        return not_ready_response()
 
     data = request.json
     user_input = data.get('input')
@@ -65,35 +156,116 @@ def chat():
     if not user_input:
         return jsonify({"output": "No input provided."}), 400
 
-    print(f"Received chat request: Input='{user_input}', History length={len(chat_history)}")
-
-    # Convert history to the format your agent expects (if different from frontend)
-    # Langchain agents often expect a list of BaseMessage (HumanMessage, AIMessage)
-    # You might need to adjust this based on your `get_dsa_agent` implementation.
-    # For now, let's assume it can handle [{'role': 'user/assistant', 'content': '...'}] or convert it.
-    
-    # Example conversion if your agent expects HumanMessage/AIMessage:
-    converted_history = []
-    # (Assuming you have HumanMessage/AIMessage from langchain.schema import HumanMessage, AIMessage)
-    # from langchain.schema import HumanMessage, AIMessage
-    # for msg in chat_history:
-    #     if msg['role'] == 'user':
-    #         converted_history.append(HumanMessage(content=msg['content']))
-    #     elif msg['role'] == 'assistant':
-    #         converted_history.append(AIMessage(content=msg['content']))
+    # The client-side list only seeds a new session; after that the server's history is used.
+    session_id = chat_sessions.get_or_create(data.get('session_id'), chat_history)
+    history = chat_sessions.history(session_id)
 
     try:
-        # Use your agent's invoke method
-        response_dict = dsa_agent_instance.invoke({
-            "input": user_input,
-            "chat_history": chat_history # Use the history as is, or converted_history
-        })
+        with trace_request("/chat", session=session_id, history_tokens=len(history) // 4) as trace:
+            # Use your agent's invoke method
+            response_dict = dsa_agent_instance.invoke({
+                "input": user_input,
+                "chat_history": history
+            }, config={"callbacks": [TracingCallbackHandler(trace)]})
         llm_response = response_dict.get("output", "I could not generate a response.")
-        return jsonify({"output": llm_response})
+        # The turn is stored before replying so a quick follow-up sees it; summarising old
+        # turns may take an LLM call, so that happens after the reply.
+        if chat_sessions.record_turn(session_id, user_input, llm_response):
+            STREAM_EXECUTOR.submit(chat_sessions.summarize, session_id)
+        return jsonify({"output": llm_response, "session_id": session_id})
     except Exception as e:
         print(f"Error invoking agent: {e}")
         return jsonify({"output": f"An error occurred while processing your request: {e}"}), 500
 
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    if not dsa_agent_instance:
+        return not_ready_response()
+
+    data = request.json
+    user_input = data.get('input')
+    chat_history = data.get('chat_history', [])
+
+    if not user_input:
+        return jsonify({"output": "No input provided."}), 400
+
+    session_id = chat_sessions.get_or_create(data.get('session_id'), chat_history)
+    history = chat_sessions.history(session_id)
+
+    events = queue.Queue()
+
+    def emit(event, payload):
+        events.put((event, payload))
+
+    def run_agent():
+        try:
+            with trace_request("/chat/stream", session=session_id, history_tokens=len(history) // 4) as trace:
+                response_dict = dsa_agent_instance.invoke(
+                    {"input": user_input, "chat_history": history},
+                    config={"callbacks": [AgentEventCallbackHandler(emit), TracingCallbackHandler(trace)]}
+                )
+            output = response_dict.get("output", "I could not generate a response.")
+            over_budget = chat_sessions.record_turn(session_id, user_input, output)
+            emit("final", {"output": output, "session_id": session_id})
+            if over_budget:
+                chat_sessions.summarize(session_id)
+        except Exception as e:
+            print(f"Error invoking agent: {e}")
+            emit("error", {"output": f"An error occurred while processing your request: {e}"})
+
+    STREAM_EXECUTOR.submit(run_agent)
+
+    def generate():
+        yield sse_event("step", {"type": "started", "session_id": session_id})
+        while True:
+            try:
+                event, payload = events.get(timeout=SSE_KEEPALIVE_SECONDS)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            yield sse_event(event, payload)
+            if event in ("final", "error"):
+                break
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def get_batch_answerer():
+    # Built on first use: it loads its own copy of the BM25 index.
+    global batch_answerer
+    with batch_answerer_lock:
+        if batch_answerer is None:
+            batch_answerer = BatchAnswerer(vectorstore_instance)
+        return batch_answerer
+
+
+@app.route('/chat/batch', methods=['POST'])
+def chat_batch():
+    # Bulk knowledge-base answers, streamed as JSON Lines in completion order. Each line
+    # carries the query's id, so an interrupted client can re-send only the missing ones.
+    if not dsa_agent_instance:
+        return not_ready_response()
+
+    data = request.json or {}
+    items = normalize_items(data.get('queries') or [])
+    if not items:
+        return jsonify({"output": "No queries provided."}), 400
+    if len(items) > BATCH_MAX_QUERIES:
+        return jsonify({"output": f"At most {BATCH_MAX_QUERIES} queries per request; split the list or use batch_answer.py."}), 413
+
+    answerer = get_batch_answerer()
+
+    def generate():
+        for result in answerer.run(items):
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    return Response(generate(), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 if __name__ == '__main__':
     # You can change the port if 5000 is in use
    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
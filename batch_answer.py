@@ -0,0 +1,208 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from langchain.chains.question_answering import load_qa_chain
+
+from rag_query import (HYBRID_RETRIEVAL, RERANK_TOP_N, RERANKER, RETRIEVAL_K, STRICT_QA_PROMPT, TOGETHER_MODEL_ID,
+                       get_base_retriever, get_reranker, get_vectorstore_instance, load_llm)
+from semantic_cache import normalize_query
+from tracing import TracingCallbackHandler, span
+
+# Queries are retrieved BATCH_SIZE at a time: one embedding forward pass and one FAISS
+# matrix search per batch. Answers are generated by up to BATCH_LLM_CONCURRENCY LLM calls
+# at once (keep it within LLM_HTTP_POOL_SIZE), and the next batch is retrieved meanwhile.
+BATCH_SIZE = int(os.environ.get("BATCH_SIZE", 32))
+BATCH_LLM_CONCURRENCY = int(os.environ.get("BATCH_LLM_CONCURRENCY", 8))
+BATCH_RERANK_WORKERS = int(os.environ.get("BATCH_RERANK_WORKERS", 4))
+BATCH_MAX_QUERIES = int(os.environ.get("BATCH_MAX_QUERIES", 1000))
+
+LEETCODE_TEMPLATE = "Explain how to solve LeetCode {title} ({difficulty}) and give the solution code."
+SOURCE_FIELDS = ("source", "page", "topic", "subtopic", "section", "title", "url")
+
+
+def query_id(query):
+    return hashlib.sha256(normalize_query(query).encode("utf-8")).hexdigest()[:16]
+
+
+def normalize_items(items):
+    """Accepts query strings or {"id", "query"} dicts and returns [{"id", "query"}].
+
+    Queries without an id get one derived from their normalised text, so re-submitting
+    the same list yields the same ids.
+    """
+    normalized = []
+    for item in items:
+        if isinstance(item, str):
+            item = {"query": item}
+        query = (item.get("query") or item.get("input") or "").strip()
+        if query:
+            normalized.append({"id": str(item.get("id") or query_id(query)), "query": query})
+    return normalized
+
+
+class BatchAnswerer:
+    """Answers many knowledge-base questions with batched retrieval and bounded LLM concurrency.
+
+    Each batch of queries goes through HybridRetriever.retrieve_many (one embedding
+    forward pass, one FAISS query matrix, BM25 fusion per query) and is reranked on a
+    small thread pool. Each query is then answered with the Knowledge Base tool's
+    strict QA prompt. The agent is not used, and neither is the semantic cache.
+    """
+
+    def __init__(self, db_instance, reranker=RERANKER, retrieval_k=RETRIEVAL_K, top_n=RERANK_TOP_N,
+                 batch_size=BATCH_SIZE, concurrency=BATCH_LLM_CONCURRENCY, hybrid=HYBRID_RETRIEVAL):
+        self.db = db_instance
+        self.compressor = get_reranker(reranker, top_n)
+        # The API's retriever, queried a batch at a time (HybridRetriever.retrieve_many).
+        self.retriever = get_base_retriever(db_instance, retrieval_k if self.compressor is not None else top_n, hybrid)
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.qa_chain = load_qa_chain(load_llm(TOGETHER_MODEL_ID), chain_type="stuff", prompt=STRICT_QA_PROMPT)
+
+    def retrieve(self, queries):
+        """Returns the final (reranked) documents for each query in `queries`."""
+        candidates = self.retriever.retrieve_many(queries)
+        if self.compressor is None:
+            return candidates
+        with span("rerank", "batch", queries=len(queries)):
+            with ThreadPoolExecutor(max_workers=BATCH_RERANK_WORKERS) as executor:
+                return list(executor.map(lambda pair: list(self.compressor.compress_documents(pair[1], pair[0])),
+                                         zip(queries, candidates)))
+
+    def answer(self, item, documents):
+        start = time.perf_counter()
+        result = {"id": item["id"], "query": item["query"]}
+        try:
+            output = self.qa_chain.invoke({"input_documents": documents, "question": item["query"]},
+                                          config={"callbacks": [TracingCallbackHandler()]})
+            result["answer"] = output["output_text"].strip()
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+        result["sources"] = [{key: doc.metadata[key] for key in SOURCE_FIELDS if doc.metadata.get(key) not in (None, "")}
+                             for doc in documents]
+        result["seconds"] = round(time.perf_counter() - start, 3)
+        return result
+
+    def run(self, items):
+        """Yields one result dict per item, in completion order (each carries its "id").
+
+        At most `concurrency` LLM calls run at once and retrieval stays about one batch
+        ahead of them, so memory does not grow with the size of the input. Closing the
+        generator (e.g. a disconnected client) cancels the queries not yet started.
+        """
+        items = normalize_items(items)
+        in_flight = set()
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch-llm")
+        try:
+            for offset in range(0, len(items), self.batch_size):
+                batch = items[offset:offset + self.batch_size]
+                try:
+                    retrieved = self.retrieve([item["query"] for item in batch])
+                except Exception as e:
+                    for item in batch:
+                        yield {"id": item["id"], "query": item["query"], "error": f"Retrieval failed: {e}"}
+                    continue
+                for item, documents in zip(batch, retrieved):
+                    in_flight.add(executor.submit(self.answer, item, documents))
+                while len(in_flight) > self.concurrency + self.batch_size:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+            while in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def load_queries(path, template=LEETCODE_TEMPLATE):
+    """Reads queries from .txt (one per line), .jsonl or .json.
+
+    JSON may hold query strings, {"id", "query"} objects, or a LeetCode problem list
+    such as data/scraped_data_gfg/leetcode_problems.json, which is turned into one
+    question per problem with `template`.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".txt"):
+            return normalize_items(line for line in f if line.strip())
+        if path.endswith(".jsonl"):
+            return normalize_items(json.loads(line) for line in f if line.strip())
+        data = json.load(f)
+    if data and all(isinstance(item, dict) and "title" in item and "link" in item for item in data):
+        items = []
+        for problem in data:
+            title = problem["title"].strip()
+            number = title.split(".", 1)[0].strip()
+            items.append({
+                "id": f"leetcode-{number}" if number.isdigit() else query_id(title),
+                "query": template.format(title=title, difficulty=problem.get("difficulty", ""), link=problem["link"]),
+            })
+        return normalize_items(items)
+    return normalize_items(data)
+
+
+def completed_ids(output_path):
+    """Ids already answered without error in an earlier (possibly interrupted) run."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a line cut off by the interruption
+            if "answer" in result and "error" not in result:
+                done.add(result["id"])
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a list of questions from the knowledge base, writing JSONL.")
+    parser.add_argument("input", help=".txt, .jsonl or .json query list (e.g. data/scraped_data_gfg/leetcode_problems.json)")
+    parser.add_argument("--output", required=True, help="JSONL file; answered ids in it are skipped, so re-running resumes")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=BATCH_LLM_CONCURRENCY, help="LLM calls in flight")
+    parser.add_argument("--reranker", default=RERANKER)
+    parser.add_argument("--template", default=LEETCODE_TEMPLATE, help="question template for LeetCode problem lists")
+    args = parser.parse_args()
+
+    # The first occurrence of a repeated id wins; resuming is keyed on ids.
+    items = list({item["id"]: item for item in reversed(load_queries(args.input, args.template))}.values())[::-1]
+    done = completed_ids(args.output)
+    pending = [item for item in items if item["id"] not in done]
+    print(f"{len(items)} queries, {len(items) - len(pending)} already answered in {args.output}, {len(pending)} to go.")
+    if not pending:
+        return
+
+    db = get_vectorstore_instance()
+    if db is None:
+        raise SystemExit("No FAISS vector store found. Run `python simplerag.py` first.")
+    answerer = BatchAnswerer(db, reranker=args.reranker, batch_size=args.batch_size, concurrency=args.concurrency)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    start = time.perf_counter()
+    answered = failed = 0
+    with open(args.output, "a", encoding="utf-8") as f:
+        for result in answerer.run(pending):
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+            f.flush()
+            if "error" in result:
+                failed += 1
+                print(f"Query {result['id']} failed: {result['error']}")
+            else:
+                answered += 1
+            if (answered + failed) % 25 == 0:
+                elapsed = time.perf_counter() - start
+                print(f"{answered + failed}/{len(pending)} done ({(answered + failed) / elapsed:.2f} queries/s)")
+    elapsed = time.perf_counter() - start
+    print(f"Answered {answered} queries ({failed} failed) in {elapsed:.1f}s. Re-run the same command to retry failures.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+from hybrid_search import BM25Index
+from embedding_cache import CachedEmbeddings
+from rag_query import BM25_INDEX_PATH, RERANKER, RETRIEVAL_K, get_retriever, get_vectorstore_instance
+from tracing import TracedEmbeddings, collect_spans
+from simplerag import (CHUNK_OVERLAP, CHUNK_SIZE, EMBED_BATCH_SIZE, assign_chunk_ids, create_chunks,
+                       discover_source_files, embed_batches, get_embedding_model, iter_batches,
+                       iter_source_documents)
+
+# Offline retrieval benchmark: runs a labelled query set against the index, never calls
+# the LLM, and reports recall@k / MRR plus per-stage latency for every configuration.
+#
+#   python benchmark_retrieval.py --chunking index,500:100 --k 5,10 --rerankers none,flashrank
+#
+# "index" is the store built by simplerag.py; size:overlap configurations are chunked
+# with create_chunks and embedded in memory for the run.
+
+QUERY_SET_PATH = "benchmarks/retrieval_queries_v1.json"
+RESULTS_DIR = "benchmarks/results"
+# Spans recorded by the served retrieval path (tracing.py, HybridRetriever.retrieve_many).
+STAGES = ("embed", "faiss", "bm25", "fetch", "rerank")
+PERCENTILES = (50, 95, 99)
+
+
+def load_query_set(path):
+    with open(path, "r", encoding="utf-8") as f:
+        query_set = json.load(f)
+    for query in query_set["queries"]:
+        if not query.get("relevant"):
+            raise ValueError(f"Query '{query['id']}' in {path} has no relevance labels.")
+    return query_set
+
+
+def matches(metadata, label, page_content=""):
+    """True when a chunk's metadata satisfies every field of one relevance label.
+
+    List values mean "any of"; `source` is compared by file name so labels do not depend
+    on where the data folder lives; `contains` is a substring of the chunk text.
+    """
+    for key, expected in label.items():
+        if key == "contains":
+            if expected.lower() not in page_content.lower():
+                return False
+            continue
+        actual = metadata.get(key)
+        if key == "source" and actual is not None:
+            actual = os.path.basename(actual)
+        options = expected if isinstance(expected, list) else [expected]
+        if actual not in options:
+            return False
+    return True
+
+
+def is_relevant(doc, labels):
+    return any(matches(doc.metadata, label, doc.page_content) for label in labels)
+
+
+class BenchmarkIndex:
+    """A store and BM25 index to run the served retriever against."""
+
+    def __init__(self, name, db, bm25_index, documents, chunk_size=None, chunk_overlap=None):
+        self.name = name
+        self.db = db
+        self.bm25_index = bm25_index
+        # (chunk id, Document) for every chunk; only used to count relevant chunks.
+        self.documents = documents
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+
+def open_built_index():
+    db = get_vectorstore_instance()
+    if db is None:
+        raise FileNotFoundError("No FAISS vector store found. Run `python simplerag.py` first.")
+    # Measure the encoder (EMBEDDING_BACKEND), not the query embedding cache.
+    if isinstance(db.embedding_function, CachedEmbeddings):
+        db.embedding_function = db.embedding_function.embedding_model
+    bm25_index = BM25Index.load(BM25_INDEX_PATH) if os.path.exists(BM25_INDEX_PATH) else None
+    documents = [(chunk_id, db.docstore.search(chunk_id)) for chunk_id in db.docstore.ids()]
+    return BenchmarkIndex("index", db, bm25_index, documents, CHUNK_SIZE, CHUNK_OVERLAP)
+
+
+def build_index(chunk_size, chunk_overlap, embedding_model, extracted_data):
+    chunks = list(assign_chunk_ids(create_chunks(extracted_data, chunk_size, chunk_overlap)))
+    print(f"Chunking {chunk_size}:{chunk_overlap} -> {len(chunks)} chunks, embedding them...")
+    start = time.perf_counter()
+    db = None
+    bm25_index = BM25Index()
+    for batch, vectors in embed_batches(iter_batches(chunks, EMBED_BATCH_SIZE), embedding_model):
+        text_embeddings = [(chunk.page_content, vector) for (_, chunk), vector in zip(batch, vectors)]
+        metadatas = [chunk.metadata for _, chunk in batch]
+        ids = [chunk_id for chunk_id, _ in batch]
+        if db is None:
+            db = FAISS.from_embeddings(text_embeddings, TracedEmbeddings(embedding_model), metadatas=metadatas, ids=ids)
+        else:
+            db.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+        for chunk_id, chunk in batch:
+            bm25_index.add(chunk_id, chunk.page_content)
+    if db is None:
+        raise ValueError("No documents found to index.")
+    print(f"Built {chunk_size}:{chunk_overlap} in {time.perf_counter() - start:.1f}s.")
+    return BenchmarkIndex(f"{chunk_size}:{chunk_overlap}", db, bm25_index, chunks, chunk_size, chunk_overlap)
+
+
+def retrieve(retriever, query, timings):
+    """Runs one query through the served retriever (see rag_query.get_retriever).
+
+    Appends each stage's milliseconds, read from the tracing spans, and the total to
+    `timings`, and returns the final ranked documents.
+    """
+    with collect_spans("benchmark") as trace:
+        start = time.perf_counter()
+        documents = retriever.invoke(query)
+        timings["total"].append((time.perf_counter() - start) * 1000)
+    for stage in STAGES:
+        seconds = [span["seconds"] for span in trace.spans if span["stage"] == stage]
+        if seconds:
+            timings[stage].append(sum(seconds) * 1000)
+    return documents
+
+
+def score_query(ranked, labels, n_relevant, ks):
+    relevant_ranks = [rank for rank, doc in enumerate(ranked, start=1) if is_relevant(doc, labels)]
+    result = {"first_relevant_rank": relevant_ranks[0] if relevant_ranks else None,
+              "reciprocal_rank": 1.0 / relevant_ranks[0] if relevant_ranks else 0.0}
+    for k in ks:
+        found = sum(1 for rank in relevant_ranks if rank <= k)
+        # Normalised by what is achievable: a query with 2 relevant chunks can reach 1.0 at k=5.
+        result[f"recall@{k}"] = found / min(k, n_relevant) if n_relevant else 0.0
+        result[f"hit@{k}"] = 1.0 if found else 0.0
+    return result
+
+
+def latency_summary(timings):
+    summary = {}
+    for stage in STAGES:
+        values = timings[stage]
+        if values:
+            summary[stage] = {f"p{p}": round(float(np.percentile(values, p)), 3) for p in PERCENTILES}
+            summary[stage]["mean"] = round(float(np.mean(values)), 3)
+    totals = timings["total"]
+    summary["total"] = {f"p{p}": round(float(np.percentile(totals, p)), 3) for p in PERCENTILES}
+    summary["total"]["mean"] = round(float(np.mean(totals)), 3)
+    return summary
+
+
+def run_config(index, queries, ks, retrieval_k, hybrid, reranker, warmup):
+    retriever = get_retriever(index.db, reranker, retrieval_k=retrieval_k, top_n=max(ks), hybrid=hybrid,
+                              bm25_index=index.bm25_index)
+    for query in queries[:warmup]:
+        retrieve(retriever, query["query"], {stage: [] for stage in STAGES + ("total",)})
+
+    timings = {stage: [] for stage in STAGES + ("total",)}
+    per_query = []
+    for query in queries:
+        labels = query["relevant"]
+        n_relevant = sum(1 for _, doc in index.documents if is_relevant(doc, labels))
+        ranked = retrieve(retriever, query["query"], timings)
+        result = score_query(ranked, labels, n_relevant, ks)
+        result.update(id=query["id"], relevant_in_corpus=n_relevant,
+                      retrieved=[{"source": os.path.basename(doc.metadata.get("source", "")),
+                                  "page": doc.metadata.get("page"),
+                                  "topic": doc.metadata.get("topic"),
+                                  "subtopic": doc.metadata.get("subtopic"),
+                                  "relevant": is_relevant(doc, labels)} for doc in ranked])
+        per_query.append(result)
+
+    answerable = [result for result in per_query if result["relevant_in_corpus"]]
+    metrics = {"queries": len(per_query), "unanswerable": len(per_query) - len(answerable),
+               "mrr": float(np.mean([r["reciprocal_rank"] for r in answerable])) if answerable else 0.0}
+    for k in ks:
+        for name in (f"recall@{k}", f"hit@{k}"):
+            metrics[name] = float(np.mean([r[name] for r in answerable])) if answerable else 0.0
+    return {
+        "config": {"chunking": index.name, "chunk_size": index.chunk_size, "chunk_overlap": index.chunk_overlap,
+                   "chunks": len(index.documents), "retrieval_k": retrieval_k,
+                   "hybrid": bool(hybrid and index.bm25_index is not None), "reranker": reranker},
+        "metrics": metrics,
+        "latency_ms": latency_summary(timings),
+        "queries": per_query,
+    }
+
+
+def parse_chunking(value):
+    configs = []
+    for item in value.split(","):
+        item = item.strip()
+        if item == "index":
+            configs.append("index")
+        elif item:
+            size, overlap = item.split(":")
+            configs.append((int(size), int(overlap)))
+    return configs
+
+
+def parse_list(value, cast=str):
+    return [cast(item.strip()) for item in value.split(",") if item.strip()]
+
+
+def print_table(results, ks):
+    columns = ["chunking", "hybrid", "reranker", "mrr"] + [f"recall@{k}" for k in ks] + [f"hit@{k}" for k in ks]
+    print("\n" + "  ".join(f"{column:>10}" for column in columns) + "  " +
+          "  ".join(f"{stage + ' p50/p95':>17}" for stage in STAGES + ("total",)))
+    for result in results:
+        config, metrics, latency = result["config"], result["metrics"], result["latency_ms"]
+        cells = [config["chunking"], str(int(config["hybrid"])), config["reranker"], f"{metrics['mrr']:.3f}"]
+        cells += [f"{metrics[f'recall@{k}']:.3f}" for k in ks] + [f"{metrics[f'hit@{k}']:.3f}" for k in ks]
+        timing_cells = [f"{latency[stage]['p50']:.1f}/{latency[stage]['p95']:.1f}" if stage in latency else "-"
+                        for stage in STAGES + ("total",)]
+        print("  ".join(f"{cell:>10}" for cell in cells) + "  " + "  ".join(f"{cell:>17}" for cell in timing_cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline retrieval benchmark (no LLM calls).")
+    parser.add_argument("--query-set", default=QUERY_SET_PATH)
+    parser.add_argument("--chunking", default="index",
+                        help="comma-separated 'index' (the built store) and/or size:overlap pairs, e.g. index,500:100")
+    parser.add_argument("--k", default="5,10", help="cutoffs for recall@k and hit@k")
+    parser.add_argument("--retrieval-k", type=int, default=RETRIEVAL_K, help="candidates fetched before reranking")
+    parser.add_argument("--rerankers", default=RERANKER, help="comma-separated: none, flashrank, cohere")
+    parser.add_argument("--hybrid", default="1", help="comma-separated 0/1: dense only and/or BM25 fusion")
+    parser.add_argument("--warmup", type=int, default=3, help="queries run untimed before each configuration")
+    parser.add_argument("--output", default=None, help="results JSON (default: benchmarks/results/retrieval_<time>.json)")
+    args = parser.parse_args()
+
+    query_set = load_query_set(args.query_set)
+    queries = query_set["queries"]
+    ks = sorted(parse_list(args.k, int))
+    rerankers = parse_list(args.rerankers)
+    hybrid_modes = [value != "0" for value in parse_list(args.hybrid)]
+    print(f"Query set '{query_set['name']}' v{query_set['version']}: {len(queries)} queries.")
+
+    chunkings = parse_chunking(args.chunking)
+    embedding_model = None
+    extracted_data = None
+    results = []
+    for chunking in chunkings:
+        if chunking == "index":
+            index = open_built_index()
+        else:
+            if extracted_data is None:
+                embedding_model = get_embedding_model()
+                extracted_data = [doc for source in discover_source_files() for doc in iter_source_documents(source)]
+            index = build_index(*chunking, embedding_model, extracted_data)
+        for hybrid in hybrid_modes:
+            if hybrid and index.bm25_index is None:
+                print(f"No BM25 index for '{index.name}', skipping hybrid=1.")
+                continue
+            for reranker in rerankers:
+                print(f"Running chunking={index.name} hybrid={int(hybrid)} reranker={reranker}...")
+                results.append(run_config(index, queries, ks, args.retrieval_k, hybrid, reranker, args.warmup))
+
+    print_table(results, ks)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"retrieval_{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({
+            "query_set": {"path": args.query_set, "name": query_set["name"], "version": query_set["version"]},
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "ks": ks,
+            "results": results,
+        }, f, indent=1, ensure_ascii=False)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
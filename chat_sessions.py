@@ -0,0 +1,255 @@
+import copy
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Fenced blocks in assistant answers: ```lang\n...\n```
+CODE_BLOCK_PATTERN = re.compile(r"```([\w+#.-]*)[^\n]*\n(.*?)```", re.DOTALL)
+DIAGRAM_LANGUAGES = ("", "text", "code", "ascii", "plaintext")
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and a Data Structures and Algorithms tutor.
+Update the summary with the new turns. Keep the topics discussed, what the user is working on, programming languages they asked for, and any detail needed to understand follow-up questions. Code and diagrams were already shown to the user; mention them by name only.
+Reply with the updated summary only, in at most {max_words} words.
+
+Current summary:
+{summary}
+
+New turns:
+{turns}
+
+Updated summary:"""
+
+
+def estimate_tokens(text):
+    # ~4 characters per token for English text and code; only used to hold a budget.
+    return (len(text) + 3) // 4
+
+
+def compact_message(content):
+    """Replaces fenced code blocks and ASCII diagrams with short references.
+
+    The user has already seen them; the agent only needs to know they were shown.
+    """
+    def reference(match):
+        language = match.group(1).lower()
+        body = match.group(2).strip("\n")
+        n_lines = body.count("\n") + 1
+        if language in DIAGRAM_LANGUAGES:
+            return f"[diagram/text block shown to the user, {n_lines} lines]"
+        first_line = next((line.strip() for line in body.splitlines() if line.strip()), "")[:80]
+        return f"[{language} code shown to the user, {n_lines} lines: {first_line}]"
+
+    return CODE_BLOCK_PATTERN.sub(reference, content).strip()
+
+
+def format_turns(turns, compact=True):
+    return "\n".join(
+        f"{'User' if turn['role'] == 'user' else 'Assistant'}: {turn['compact'] if compact else turn['content']}"
+        for turn in turns
+    )
+
+
+class SessionStore:
+    """Server-side chat sessions with a token-budgeted history for the agent prompt.
+
+    Each session keeps a rolling summary plus the most recent turns, with code blocks
+    and diagrams in assistant answers replaced by short references. Once the history
+    exceeds `token_budget`, `summarize` folds the oldest turns into the summary (with
+    `llm` when given, otherwise by truncation), so the prompt stays roughly the same
+    size however long the conversation runs. When `path` is set, sessions are kept in a
+    SQLite file shared by all gunicorn workers; otherwise in memory, LRU-bounded.
+    """
+
+    def __init__(self, llm=None, token_budget=1500, summary_tokens=300, ttl_seconds=24 * 3600, max_sessions=10000, path=None):
+        self.llm = llm
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.path = path
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._session_locks = OrderedDict()
+        self._summarizing = set()
+        self._db = None
+        self._pid = os.getpid()
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, timeout=5)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS chat_sessions (id TEXT PRIMARY KEY, data TEXT, updated_at REAL)")
+            self._db.commit()
+
+    def _database(self):
+        # Called under self._lock. SQLite connections must not cross a fork (gunicorn
+        # --preload), so a forked worker opens its own.
+        if self._pid != os.getpid():
+            self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            self._pid = os.getpid()
+        return self._db
+
+    def _session_lock(self, session_id):
+        # Serialises turns of one session without blocking the others during summarisation.
+        with self._lock:
+            lock = self._session_locks.get(session_id)
+            if lock is None:
+                lock = self._session_locks[session_id] = threading.Lock()
+            self._session_locks.move_to_end(session_id)
+            # Least recently used first; a lock that is held is never dropped.
+            for old_id in list(self._session_locks):
+                if len(self._session_locks) <= self.max_sessions:
+                    break
+                if not self._session_locks[old_id].locked():
+                    del self._session_locks[old_id]
+            return lock
+
+    def _load(self, session_id):
+        # Returns a copy; changes only take effect through _save.
+        with self._lock:
+            if self._db is not None:
+                row = self._database().execute("SELECT data, updated_at FROM chat_sessions WHERE id = ?", (session_id,)).fetchone()
+                session = json.loads(row[0]) if row else None
+                updated_at = row[1] if row else 0
+            else:
+                session = copy.deepcopy(self._sessions.get(session_id))
+                updated_at = session["updated_at"] if session else 0
+        if session is None or (self.ttl_seconds and time.time() - updated_at > self.ttl_seconds):
+            return None
+        return session
+
+    def _save(self, session_id, session):
+        session["updated_at"] = time.time()
+        with self._lock:
+            if self._db is not None:
+                self._database().execute("INSERT OR REPLACE INTO chat_sessions (id, data, updated_at) VALUES (?, ?, ?)",
+                                 (session_id, json.dumps(session, ensure_ascii=False), session["updated_at"]))
+                if self.ttl_seconds:
+                    self._database().execute("DELETE FROM chat_sessions WHERE updated_at < ?", (time.time() - self.ttl_seconds,))
+                self._database().commit()
+            else:
+                self._sessions[session_id] = copy.deepcopy(session)
+                self._sessions.move_to_end(session_id)
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+
+    def get_or_create(self, session_id=None, chat_history=None):
+        """Returns the id of an existing session, or of a new one seeded from `chat_history`.
+
+        `chat_history` is the client-side [{'role', 'content'}] list older clients send;
+        it is only used when the session is unknown (new, expired or lost on restart).
+        """
+        session_id = session_id or uuid.uuid4().hex
+        with self._session_lock(session_id):
+            if self._load(session_id) is not None:
+                return session_id
+            session = {"summary": "", "turns": []}
+            for message in chat_history or []:
+                if message.get("role") in ("user", "assistant") and message.get("content"):
+                    self._append(session, message["role"], message["content"])
+            # Seeding happens on the request path, so it truncates instead of calling the LLM.
+            dropped = self._overflow(session)
+            if dropped:
+                session["turns"] = session["turns"][len(dropped):]
+                session["summary"] = self._fold(session["summary"], dropped, use_llm=False)
+            self._save(session_id, session)
+            return session_id
+
+    def history(self, session_id):
+        """Chat history text for the agent's {chat_history} prompt slot."""
+        with self._session_lock(session_id):
+            session = self._load(session_id) or {"summary": "", "turns": []}
+        dropped = self._overflow(session)
+        if dropped:
+            # Summarisation has not caught up yet; truncate this copy to stay within budget.
+            session["turns"] = session["turns"][len(dropped):]
+            session["summary"] = self._fold(session["summary"], dropped, use_llm=False)
+        parts = []
+        if session["summary"]:
+            parts.append(f"Summary of the earlier conversation: {session['summary']}")
+        turns = session["turns"]
+        if turns and turns[-1]["role"] == "assistant" and estimate_tokens(turns[-1]["content"]) <= self.token_budget // 2:
+            # The latest answer is kept verbatim when it fits, for "run that code"-style follow-ups.
+            parts.append(format_turns(turns[:-1]) if len(turns) > 1 else "")
+            parts.append(format_turns(turns[-1:], compact=False))
+        elif turns:
+            parts.append(format_turns(turns))
+        return "\n".join(part for part in parts if part)
+
+    def record_turn(self, session_id, user_input, output):
+        """Appends one exchange; call it before the answer is sent, so follow-ups see it.
+
+        Returns True when the history is over budget and `summarize` should run.
+        """
+        with self._session_lock(session_id):
+            session = self._load(session_id) or {"summary": "", "turns": []}
+            self._append(session, "user", user_input)
+            self._append(session, "assistant", output)
+            self._save(session_id, session)
+            return bool(self._overflow(session))
+
+    def summarize(self, session_id):
+        """Folds the turns over budget into the summary. May call the LLM; run it in the background.
+
+        The LLM runs without holding the session lock. Its result is only merged if no
+        other summarisation folded the same turns meanwhile; turns recorded in between are kept.
+        """
+        with self._lock:
+            if session_id in self._summarizing:
+                return
+            self._summarizing.add(session_id)
+        try:
+            with self._session_lock(session_id):
+                session = self._load(session_id)
+                dropped = self._overflow(session) if session else []
+            if not dropped:
+                return
+            summary = self._fold(session["summary"], dropped, use_llm=True)
+            with self._session_lock(session_id):
+                current = self._load(session_id)
+                if current is None or current["summary"] != session["summary"] or current["turns"][:len(dropped)] != dropped:
+                    return
+                current["turns"] = current["turns"][len(dropped):]
+                current["summary"] = summary
+                self._save(session_id, current)
+        finally:
+            with self._lock:
+                self._summarizing.discard(session_id)
+
+    @staticmethod
+    def _append(session, role, content):
+        session["turns"].append({"role": role, "content": content, "compact": compact_message(content)})
+
+    def _size(self, session):
+        return estimate_tokens(session["summary"]) + sum(estimate_tokens(turn["compact"]) for turn in session["turns"])
+
+    def _overflow(self, session):
+        """The oldest turns that have to be folded into the summary to fit the budget."""
+        size = self._size(session)
+        count = 0
+        # Always keep the latest exchange.
+        while size > self.token_budget and len(session["turns"]) - count > 2:
+            size -= estimate_tokens(session["turns"][count]["compact"])
+            count += 1
+        return session["turns"][:count]
+
+    def _fold(self, summary, dropped, use_llm):
+        new_summary = None
+        if use_llm and self.llm is not None:
+            try:
+                new_summary = self.llm.invoke(SUMMARY_PROMPT.format(
+                    max_words=int(self.summary_tokens * 0.75),
+                    summary=summary or "(none)",
+                    turns=format_turns(dropped),
+                )).strip()
+            except Exception as e:
+                print(f"History summarisation failed, truncating instead: {e}")
+        if not new_summary:
+            new_summary = " ".join(filter(None, [summary, format_turns(dropped).replace("\n", " ")]))
+            # Keep the most recent part of the running text.
+            new_summary = new_summary[-self.summary_tokens * 4:]
+        return new_summary[:self.summary_tokens * 4]
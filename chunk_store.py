@@ -0,0 +1,118 @@
+import json
+import os
+import sqlite3
+import threading
+from collections.abc import Mapping
+
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+
+CHUNK_STORE_FILENAME = "chunks.sqlite"
+
+_reconnect_lock = threading.Lock()
+
+
+class ChunkStore(Docstore, AddableMixin):
+    """SQLite-backed docstore for the FAISS chunks.
+
+    Replaces the pickled InMemoryDocstore: chunk text and metadata (JSON) live in a
+    `chunks` table keyed by chunk id, and the FAISS row -> chunk id mapping in a
+    `positions` table. Rows are read on demand, so a serving worker only touches the
+    chunks a query actually returns. Writes stay in one transaction until `commit()`.
+    """
+
+    def __init__(self, path, read_only=False):
+        self.path = path
+        self.read_only = read_only
+        if not read_only:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._connect()
+        if not read_only:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, page_content TEXT NOT NULL, metadata TEXT NOT NULL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS positions (position INTEGER PRIMARY KEY, id TEXT NOT NULL)")
+            self._conn.commit()
+
+    def _connect(self):
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        if self.read_only:
+            self._conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+
+    def _connection(self):
+        # SQLite connections must not cross a fork (gunicorn --preload): reopen in the child.
+        if self._pid != os.getpid():
+            with _reconnect_lock:
+                if self._pid != os.getpid():
+                    self._connect()
+        return self._conn
+
+    def _execute(self, sql, params=()):
+        conn = self._connection()
+        with self._lock:
+            return conn.execute(sql, params).fetchall()
+
+    def search(self, search):
+        rows = self._execute("SELECT page_content, metadata FROM chunks WHERE id = ?", (search,))
+        if not rows:
+            return f"ID {search} not found."
+        page_content, metadata = rows[0]
+        return Document(id=search, page_content=page_content, metadata=json.loads(metadata))
+
+    def add(self, texts):
+        # Replacing an existing id is allowed, which is how metadata gets refreshed.
+        conn = self._connection()
+        with self._lock:
+            conn.executemany(
+                "INSERT OR REPLACE INTO chunks (id, page_content, metadata) VALUES (?, ?, ?)",
+                [(chunk_id, doc.page_content, json.dumps(doc.metadata, ensure_ascii=False)) for chunk_id, doc in texts.items()],
+            )
+
+    def delete(self, ids):
+        conn = self._connection()
+        with self._lock:
+            conn.executemany("DELETE FROM chunks WHERE id = ?", [(chunk_id,) for chunk_id in ids])
+
+    def ids(self):
+        return [row[0] for row in self._execute("SELECT id FROM chunks")]
+
+    def load_positions(self):
+        return {position: chunk_id for position, chunk_id in self._execute("SELECT position, id FROM positions")}
+
+    def write_positions(self, index_to_docstore_id):
+        conn = self._connection()
+        with self._lock:
+            conn.execute("DELETE FROM positions")
+            conn.executemany(
+                "INSERT INTO positions (position, id) VALUES (?, ?)",
+                [(int(position), chunk_id) for position, chunk_id in index_to_docstore_id.items()],
+            )
+
+    def commit(self):
+        conn = self._connection()
+        with self._lock:
+            conn.commit()
+
+    def __len__(self):
+        return self._execute("SELECT COUNT(*) FROM chunks")[0][0]
+
+
+class ChunkPositions(Mapping):
+    """Read-only FAISS row -> chunk id mapping that looks rows up in the chunk store."""
+
+    def __init__(self, chunk_store):
+        self.chunk_store = chunk_store
+        self._length = chunk_store._execute("SELECT COUNT(*) FROM positions")[0][0]
+
+    def __getitem__(self, position):
+        rows = self.chunk_store._execute("SELECT id FROM positions WHERE position = ?", (int(position),))
+        if not rows:
+            raise KeyError(position)
+        return rows[0][0]
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        return (row[0] for row in self.chunk_store._execute("SELECT position FROM positions ORDER BY position"))
@@ -0,0 +1,213 @@
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from semantic_cache import normalize_query
+from tracing import increment
+
+EMBEDDING_MODEL_NAME = "BAAI/bge-small-en"
+# Query encoder: "torch" (sentence-transformers default), "onnx" or "onnx-int8" (ONNX
+# Runtime, dynamically quantised; needs `pip install optimum[onnxruntime]`). The ONNX
+# models are exported once into EMBEDDING_ONNX_DIR.
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch").lower()
+EMBEDDING_ONNX_DIR = os.environ.get("EMBEDDING_ONNX_DIR", "vectorstore/onnx")
+EMBEDDING_ONNX_QUANTIZATION = os.environ.get("EMBEDDING_ONNX_QUANTIZATION", "avx2")
+
+
+def load_embedding_model(model_name=EMBEDDING_MODEL_NAME, backend=EMBEDDING_BACKEND):
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    if backend == "torch":
+        return HuggingFaceEmbeddings(model_name=model_name)
+    if backend not in ("onnx", "onnx-int8"):
+        raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}', expected one of: torch, onnx, onnx-int8.")
+
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.backend import export_dynamic_quantized_onnx_model
+
+    model_dir = os.path.join(EMBEDDING_ONNX_DIR, model_name.replace("/", "--"))
+    if not glob.glob(os.path.join(model_dir, "**", "model.onnx"), recursive=True):
+        print(f"Exporting {model_name} to ONNX in {model_dir} (one-off).")
+        SentenceTransformer(model_name, backend="onnx").save_pretrained(model_dir)
+    file_name = "model.onnx"
+    if backend == "onnx-int8":
+        file_name = f"onnx/model_qint8_{EMBEDDING_ONNX_QUANTIZATION}.onnx"
+        if not os.path.exists(os.path.join(model_dir, file_name)):
+            print(f"Quantising {model_name} to int8 ({EMBEDDING_ONNX_QUANTIZATION}) in {model_dir} (one-off).")
+            export_dynamic_quantized_onnx_model(SentenceTransformer(model_dir, backend="onnx"),
+                                                EMBEDDING_ONNX_QUANTIZATION, model_dir)
+    return HuggingFaceEmbeddings(model_name=model_dir,
+                                 model_kwargs={"backend": "onnx", "model_kwargs": {"file_name": file_name}})
+
+
+class CachedEmbeddings(Embeddings):
+    """Embedding model wrapper that caches vectors by normalised text.
+
+    Lookups hit an in-process LRU of `max_size` vectors first. When `path` is set, they
+    fall back to a SQLite store shared by all gunicorn workers and kept across restarts.
+    Only the texts that miss both are encoded, in one batch per call. Entries are keyed
+    by `model_id` too, so switching the encoder never returns stale vectors. The store
+    counts hits per query; `warm` uses that to preload the most frequent ones.
+    """
+
+    def __init__(self, embedding_model, model_id, max_size=10000, path=None, max_disk_entries=100000):
+        self.embedding_model = embedding_model
+        self.model_id = model_id
+        self.max_size = max_size
+        self.path = path
+        self.max_disk_entries = max_disk_entries
+        self._entries = OrderedDict()
+        self._pending_hits = {}
+        self._lock = threading.Lock()
+        self._db = None
+        self._pid = os.getpid()
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, timeout=5)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embedding_cache ("
+                "key TEXT PRIMARY KEY, model TEXT, query TEXT, embedding BLOB, hits INTEGER, last_used REAL)"
+            )
+            self._db.commit()
+
+    def _database(self):
+        # Called under self._lock. SQLite connections must not cross a fork (gunicorn
+        # --preload), so a forked worker opens its own.
+        if self._pid != os.getpid():
+            self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            self._pid = os.getpid()
+        return self._db
+
+    def _key(self, text):
+        return hashlib.sha256(f"{self.model_id}\x00{normalize_query(text)}".encode("utf-8")).hexdigest()
+
+    def _put(self, key, vector):
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _flush_hits(self):
+        # Called under self._lock. Hit counts are written in batches, not per lookup.
+        if self._db is None or not self._pending_hits:
+            return
+        now = time.time()
+        self._database().executemany("UPDATE embedding_cache SET hits = hits + ?, last_used = ? WHERE key = ?",
+                                     [(hits, now, key) for key, hits in self._pending_hits.items()])
+        self._database().commit()
+        self._pending_hits.clear()
+
+    def _lookup(self, keys):
+        """Returns {key: vector} for the keys found in memory or on disk."""
+        found = {}
+        with self._lock:
+            for key in keys:
+                vector = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    found[key] = vector
+            missing = [key for key in keys if key not in found]
+            if self._db is not None and missing:
+                placeholders = ",".join("?" * len(missing))
+                rows = self._database().execute(
+                    f"SELECT key, embedding FROM embedding_cache WHERE key IN ({placeholders})", missing).fetchall()
+                for key, embedding in rows:
+                    found[key] = np.frombuffer(embedding, dtype=np.float32)
+                    self._put(key, found[key])
+            if self._db is not None:
+                for key in found:
+                    self._pending_hits[key] = self._pending_hits.get(key, 0) + 1
+                if len(self._pending_hits) >= 50:
+                    self._flush_hits()
+        return found
+
+    def _store(self, texts, keys, vectors):
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                self._put(key, vector)
+            if self._db is not None:
+                now = time.time()
+                self._database().executemany(
+                    "INSERT OR IGNORE INTO embedding_cache (key, model, query, embedding, hits, last_used) VALUES (?, ?, ?, ?, 0, ?)",
+                    [(key, self.model_id, text, vector.tobytes(), now) for text, key, vector in zip(texts, keys, vectors)])
+                self._flush_hits()
+                self._database().commit()
+
+    def _embed(self, texts, query=False):
+        keys = [self._key(text) for text in texts]
+        found = self._lookup(keys)
+        misses = {}
+        for text, key in zip(texts, keys):
+            if key not in found:
+                misses.setdefault(key, text)
+        increment("dsa_cache_requests_total", len(texts) - len(misses), cache="embedding", result="hit")
+        increment("dsa_cache_requests_total", len(misses), cache="embedding", result="miss")
+        if misses:
+            miss_texts = list(misses.values())
+            if query:
+                vectors = np.asarray([self.embedding_model.embed_query(miss_texts[0])], dtype=np.float32)
+            else:
+                vectors = np.asarray(self.embedding_model.embed_documents(miss_texts), dtype=np.float32)
+            self._store(miss_texts, list(misses), vectors)
+            found.update(zip(misses, vectors))
+        return [found[key].tolist() for key in keys]
+
+    def embed_query(self, text):
+        return self._embed([text], query=True)[0]
+
+    def embed_documents(self, texts):
+        return self._embed(list(texts))
+
+    def warm(self, top_n, queries=()):
+        """Preloads the `top_n` most frequent stored queries, then encodes `queries` not cached yet.
+
+        Run at start-up; under gunicorn --preload the warmed LRU is shared by every worker.
+        Returns the number of vectors now in memory.
+        """
+        if self._db is not None and top_n:
+            with self._lock:
+                self._flush_hits()
+                rows = self._database().execute(
+                    "SELECT key, embedding FROM embedding_cache WHERE model = ? ORDER BY hits DESC, last_used DESC LIMIT ?",
+                    (self.model_id, top_n)).fetchall()
+                for key, embedding in reversed(rows):
+                    self._put(key, np.frombuffer(embedding, dtype=np.float32))
+                # Prune the long tail so the shared store stays bounded.
+                self._database().execute(
+                    "DELETE FROM embedding_cache WHERE key NOT IN "
+                    "(SELECT key FROM embedding_cache ORDER BY hits DESC, last_used DESC LIMIT ?)",
+                    (self.max_disk_entries,))
+                self._database().commit()
+        queries = [query for query in queries if query.strip()][:top_n or None]
+        for offset in range(0, len(queries), 64):
+            self._embed(queries[offset:offset + 64])
+        return len(self._entries)
+
+    def __getattr__(self, name):
+        return getattr(self.embedding_model, name)
+
+
+def read_warm_queries(path):
+    """Queries for CachedEmbeddings.warm from a text file (one per line) or JSONL ("query"/"input")."""
+    if not path or not os.path.exists(path):
+        return []
+    queries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith(".jsonl"):
+                record = json.loads(line)
+                line = (record.get("query") or record.get("input") or "") if isinstance(record, dict) else str(record)
+            queries.append(line)
+    return queries
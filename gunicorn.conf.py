@@ -0,0 +1,56 @@
+import glob
+import os
+import tempfile
+
+# Picked up automatically by `gunicorn backend:app` from the project directory.
+#
+# preload_app loads backend.py (embedding model, FAISS index, agent) once in the master;
+# workers are forked from it and share those pages copy-on-write, so adding a worker
+# or scaling out costs a fork instead of a full model load.
+preload_app = True
+workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+timeout = 120
+
+TORCH_NUM_THREADS = int(os.environ.get("TORCH_NUM_THREADS", max(1, (os.cpu_count() or 1) // workers)))
+
+# The master runs the model during start-up (router exemplars). An OpenMP thread pool
+# created before fork() can hang in the children, so keep the master single-threaded
+# and size the pool per worker in post_fork.
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+
+# Workers sum their /metrics histograms and counters into one SQLite file (tracing.py),
+# so every scrape sees the totals of all workers. Unless METRICS_PATH is set, each master
+# start gets a fresh file, removed again on exit.
+TEMPORARY_METRICS_PATH = None
+if not os.environ.get("METRICS_PATH"):
+    TEMPORARY_METRICS_PATH = os.path.join(tempfile.gettempdir(), f"dsa-metrics-{os.getpid()}.sqlite")
+    os.environ["METRICS_PATH"] = TEMPORARY_METRICS_PATH
+
+
+def when_ready(server):
+    # The master never serves requests: stop the Python REPL workers it started while
+    # loading the app, so they are not inherited by every forked worker.
+    from python_sandbox import close_sandbox_pool
+    close_sandbox_pool()
+
+
+def post_fork(server, worker):
+    import torch
+    torch.set_num_threads(TORCH_NUM_THREADS)
+    # SQLite connections and the LLM HTTP session reopen lazily in the worker. The
+    # sandbox pool is started now so the first Python REPL call does not wait for it.
+    from python_sandbox import get_sandbox_pool
+    get_sandbox_pool()
+    # BACKEND_INIT_MODE=background: the preloading master skips the loader thread (it
+    # would not survive the fork), so every worker starts its own here.
+    if os.environ.get("BACKEND_INIT_MODE") == "background":
+        import backend
+        backend.start_background_startup()
+
+
+def on_exit(server):
+    if TEMPORARY_METRICS_PATH:
+        for path in glob.glob(TEMPORARY_METRICS_PATH + "*"):  # with the -wal and -shm files
+            os.remove(path)
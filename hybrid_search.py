@@ -0,0 +1,180 @@
+import heapq
+import json
+import math
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+from tracing import span
+
+BM25_INDEX_FILENAME = "bm25_index.json"
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9_]+")
+STOPWORDS = frozenset("""a an and are as at be by can do does for from how i in is it me of on or show
+that the this to what when where which who why with you your""".split())
+
+
+def tokenize(text):
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """Sparse BM25 index over the same chunk ids as the FAISS store.
+
+    Only the per-chunk term frequencies are persisted (as JSON, next to the FAISS
+    index); the inverted postings are rebuilt in memory on load. Exact tokens such as
+    problem numbers or C function names score highly here even when the dense
+    embedding misses them.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_terms = {}
+        self.postings = {}
+        self.doc_lengths = {}
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.doc_terms)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.doc_terms
+
+    def add(self, doc_id, text):
+        if doc_id in self.doc_terms:
+            self.remove(doc_id)
+        self._index(doc_id, dict(Counter(tokenize(text))))
+
+    def _index(self, doc_id, terms):
+        self.doc_terms[doc_id] = terms
+        length = sum(terms.values())
+        self.doc_lengths[doc_id] = length
+        self.total_length += length
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+
+    def remove(self, doc_id):
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self.total_length -= self.doc_lengths.pop(doc_id)
+        for term in terms:
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self.postings[term]
+
+    def search(self, query, k=25):
+        """Returns up to k (doc_id, score) pairs, best first."""
+        if not self.doc_terms:
+            return []
+        n_docs = len(self.doc_terms)
+        avg_length = self.total_length / n_docs or 1.0
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "k1": self.k1, "b": self.b, "docs": self.doc_terms}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls(k1=data.get("k1", 1.5), b=data.get("b", 0.75))
+        for doc_id, terms in data["docs"].items():
+            index._index(doc_id, terms)
+        return index
+
+
+def reciprocal_rank_fusion(ranked_lists, k, rrf_k=60):
+    """Fuses ranked id lists: score(id) = sum over lists of 1 / (rrf_k + rank)."""
+    scores = {}
+    for ranked in ranked_lists:
+        for rank, doc_id in enumerate(ranked, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (rrf_k + rank)
+    return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+
+class HybridRetriever(BaseRetriever):
+    """Dense FAISS search and BM25 search fused with reciprocal rank fusion.
+
+    Without a BM25 index (`bm25_index=None`) it returns the dense results alone. Single
+    queries (the API) and batches (batch_answer.py) both go through `retrieve_many`.
+    """
+
+    vectorstore: object
+    bm25_index: object = None
+    k: int = 25
+    dense_k: int = 25
+    sparse_k: int = 25
+    rrf_k: int = 60
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        return self.retrieve_many([query])[0]
+
+    def retrieve_many(self, queries):
+        """Returns the fused documents for each query in `queries`.
+
+        The queries are embedded in one forward pass and searched in FAISS as one query
+        matrix. Chunks shared between queries are read from the docstore once.
+        """
+        # Embedded separately so the FAISS span does not include the query embedding.
+        if len(queries) == 1:
+            vectors = [self.vectorstore.embeddings.embed_query(queries[0])]
+        else:
+            vectors = self.vectorstore.embeddings.embed_documents(queries)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with span("faiss", queries=len(queries)):
+            if getattr(self.vectorstore, "_normalize_L2", False):
+                vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            _, positions = self.vectorstore.index.search(vectors, self.dense_k)
+        dense_ids = [[self.vectorstore.index_to_docstore_id[int(position)] for position in row if position >= 0]
+                     for row in positions]
+
+        if self.bm25_index is None:
+            ranked = [[(doc_id, None) for doc_id in ids[:self.k]] for ids in dense_ids]
+        else:
+            with span("bm25", queries=len(queries)):
+                ranked = [reciprocal_rank_fusion(
+                    [ids, [doc_id for doc_id, _ in self.bm25_index.search(query, k=self.sparse_k)]], self.k, self.rrf_k)
+                    for query, ids in zip(queries, dense_ids)]
+
+        with span("fetch", queries=len(queries)):
+            documents = {}
+            for doc_id in {doc_id for fused in ranked for doc_id, _ in fused}:
+                doc = self.vectorstore.docstore.search(doc_id)
+                if isinstance(doc, Document):
+                    documents[doc_id] = doc
+        results = []
+        for fused in ranked:
+            results.append([])
+            for doc_id, score in fused:
+                doc = documents.get(doc_id)
+                if doc is None:
+                    continue
+                metadata = doc.metadata if score is None else {**doc.metadata, "rrf_score": score}
+                results[-1].append(Document(id=doc_id, page_content=doc.page_content, metadata=metadata))
+        return results
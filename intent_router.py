@@ -0,0 +1,157 @@
+import re
+
+import numpy as np
+
+from tracing import span
+
+KNOWLEDGE = "knowledge"
+OUT_OF_DOMAIN = "out_of_domain"
+AGENT = "agent"
+
+# Tags the Knowledge Base run on the fast path: its answer is the final answer, so
+# streaming callback handlers forward all of its LLM tokens.
+FINAL_ANSWER_TAG = "final_answer"
+
+# Labelled exemplar queries. Single-tool questions answered straight from the knowledge
+# base go to KNOWLEDGE, anything needing diagrams, code execution or new code to AGENT.
+EXEMPLARS = {
+    KNOWLEDGE: [
+        "What is a binary search tree?",
+        "Explain quicksort",
+        "What is quick sort and how does it work?",
+        "Explain the merge sort algorithm",
+        "What is the time complexity of binary search?",
+        "Difference between a stack and a queue",
+        "Compare Dijkstra's and Bellman-Ford",
+        "What is dynamic programming?",
+        "Explain memoization and tabulation",
+        "What is a linked list?",
+        "How does hashing work?",
+        "What is a heap data structure?",
+        "Explain breadth first search",
+        "What is the worst case analysis of an algorithm?",
+        "What is recursion?",
+        "Show Python code for Dijkstra's algorithm from the knowledge base",
+        "Show me the Java code for reversing a linked list",
+        "Give me the C code for insertion in a deque",
+        "What is LeetCode problem 1 Two Sum?",
+        "What is the difficulty of LeetCode 3335?",
+        "What are the applications of a queue?",
+        "Define big O notation",
+    ],
+    AGENT: [
+        "Draw an ASCII diagram of a linked list",
+        "Visualize a binary tree with nodes 1 to 7",
+        "Show a diagram of how a stack push and pop works",
+        "Explain BFS with a diagram",
+        "Run this Python code and show the output",
+        "Execute print(sorted([3, 1, 2]))",
+        "What is the output of this code?",
+        "Write a Java function to implement a queue using two stacks",
+        "Generate Python code for a custom hash map",
+        "Write code for a new problem: find the longest palindrome in a string",
+        "Implement a trie in C++ and test it",
+        "Explain merge sort, visualize it and give the code",
+        "Create a comparison table of arrays and linked lists",
+    ],
+    OUT_OF_DOMAIN: [
+        "What is the capital of France?",
+        "Who won the football world cup?",
+        "What is the weather today?",
+        "Tell me a joke",
+        "Who is the president of the United States?",
+        "Recommend a good movie",
+        "How do I cook pasta?",
+        "What is the price of bitcoin?",
+        "Translate hello into Spanish",
+        "Write a poem about the sea",
+    ],
+}
+
+# Phrases that always need the agent's extra tools, whatever the embedding says.
+AGENT_PATTERN = re.compile(
+    r"\b(diagrams?|visuali[sz](e|ation)|draw|ascii|illustrate|run (this|the|it|my)|execute|output of|repl|"
+    r"test (it|this|the code)|write (a|the|me|some)?\s*(code|function|program|class)|generate|comparison table)\b",
+    re.IGNORECASE,
+)
+# Follow-ups that lean on earlier turns need the agent, which sees the chat history.
+FOLLOW_UP_PATTERN = re.compile(r"\b(it|this|that|these|those|above|previous|again|more|same|another)\b", re.IGNORECASE)
+
+
+class IntentRouter:
+    """Routes a query to the knowledge-base fast path, a canned refusal or the agent.
+
+    Queries are embedded and compared with the labelled exemplars; each label scores the
+    mean of its `top_k` best cosine similarities. Only a clear winner leaves the agent
+    path: KNOWLEDGE must beat the runner-up by `margin`, OUT_OF_DOMAIN must additionally
+    reach `out_of_domain_threshold`. Everything else falls through to the agent.
+    """
+
+    def __init__(self, embedding_model, margin=0.03, out_of_domain_threshold=0.80, top_k=3):
+        self.embedding_model = embedding_model
+        self.margin = margin
+        self.out_of_domain_threshold = out_of_domain_threshold
+        self.top_k = top_k
+        self.labels = []
+        texts = []
+        for label, queries in EXEMPLARS.items():
+            self.labels.extend([label] * len(queries))
+            texts.extend(queries)
+        self.labels = np.array(self.labels)
+        self.matrix = self._normalize(np.asarray(embedding_model.embed_documents(texts), dtype=np.float32))
+
+    @staticmethod
+    def _normalize(vectors):
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def scores(self, query):
+        vector = self._normalize(np.asarray(self.embedding_model.embed_query(query), dtype=np.float32))
+        similarities = self.matrix @ vector
+        return {
+            label: float(np.mean(np.sort(similarities[self.labels == label])[-self.top_k:]))
+            for label in EXEMPLARS
+        }
+
+    def route(self, query, chat_history=None):
+        if AGENT_PATTERN.search(query):
+            return AGENT
+        if chat_history and FOLLOW_UP_PATTERN.search(query):
+            return AGENT
+
+        scores = self.scores(query)
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        best, runner_up = ranked[0], ranked[1]
+        if scores[best] - scores[runner_up] < self.margin:
+            return AGENT
+        if best == OUT_OF_DOMAIN and scores[best] < self.out_of_domain_threshold:
+            return AGENT
+        return best
+
+
+class RoutedAgent:
+    """Drop-in wrapper around the agent executor that short-circuits single-tool queries."""
+
+    def __init__(self, agent, router, knowledge_tool, refusal):
+        self.agent = agent
+        self.router = router
+        self.knowledge_tool = knowledge_tool
+        self.refusal = refusal
+
+    def invoke(self, inputs, config=None, **kwargs):
+        query = inputs["input"]
+        with span("route") as attributes:
+            route = attributes["route"] = self.router.route(query, inputs.get("chat_history"))
+        if route == KNOWLEDGE:
+            # Invoked as a tool so callback handlers still see the step.
+            config = dict(config or {})
+            config["tags"] = [*config.get("tags", []), FINAL_ANSWER_TAG]
+            output = self.knowledge_tool.invoke(query, config=config)
+        elif route == OUT_OF_DOMAIN:
+            output = self.refusal
+        else:
+            return {**self.agent.invoke(inputs, config=config, **kwargs), "route": AGENT}
+        return {**inputs, "output": output, "route": route}
+
+    def __getattr__(self, name):
+        return getattr(self.agent, name)
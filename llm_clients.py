@@ -0,0 +1,156 @@
+import json
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from langchain_community.llms import Together
+from langchain_core.outputs import Generation, LLMResult
+
+TOGETHER_STREAM_URL = "https://api.together.xyz/v1/completions"
+
+# One keep-alive connection pool per process, shared by every LLM instance.
+LLM_HTTP_POOL_SIZE = int(os.environ.get("LLM_HTTP_POOL_SIZE", 16))
+LLM_CONNECT_TIMEOUT = float(os.environ.get("LLM_CONNECT_TIMEOUT", 5))
+LLM_READ_TIMEOUT = float(os.environ.get("LLM_READ_TIMEOUT", 120))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 3))
+LLM_RETRY_BACKOFF = float(os.environ.get("LLM_RETRY_BACKOFF", 0.5))
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+_llm_registry = {}
+_registry_lock = threading.Lock()
+
+
+def get_http_session():
+    """Process-wide requests.Session with a bounded keep-alive pool and retry with backoff.
+
+    Connection errors and 429/5xx responses are retried with exponential backoff
+    (honouring Retry-After). `pool_block` makes callers wait for a free connection
+    instead of opening more than LLM_HTTP_POOL_SIZE at once. A forked worker gets its
+    own session rather than sharing the parent's sockets.
+    """
+    global _session, _session_pid
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            retry = Retry(
+                total=LLM_MAX_RETRIES,
+                backoff_factor=LLM_RETRY_BACKOFF,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset(["POST"]),
+                respect_retry_after_header=True,
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=LLM_HTTP_POOL_SIZE, max_retries=retry, pool_block=True)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+            _session_pid = os.getpid()
+        return _session
+
+
+class PooledTogether(Together):
+    """Together LLM that sends its requests over the shared pooled session.
+
+    The community `Together` class opens a new HTTP session for every call and has
+    no streaming support. This one reuses keep-alive connections and, when `streaming`
+    is set, forwards tokens to the callback handlers as they arrive.
+    """
+
+    streaming: bool = False
+
+    def _headers(self):
+        return {
+            "Authorization": f"Bearer {self.together_api_key.get_secret_value()}",
+            "Content-Type": "application/json",
+            "User-Agent": self.get_user_agent(),
+        }
+
+    def _generate(self, prompts, stop=None, run_manager=None, **kwargs):
+        # Same as LLM._generate, but keeps the token usage Together reports so callback
+        # handlers see it in llm_output.
+        generations = []
+        token_usage = {}
+        for prompt in prompts:
+            text, usage = self._complete(prompt, stop, run_manager, **kwargs)
+            generations.append([Generation(text=text)])
+            for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+                if usage.get(key) is not None:
+                    token_usage[key] = token_usage.get(key, 0) + usage[key]
+        return LLMResult(generations=generations, llm_output={"token_usage": token_usage, "model_name": self.model})
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        return self._complete(prompt, stop, run_manager, **kwargs)[0]
+
+    def _complete(self, prompt, stop=None, run_manager=None, **kwargs):
+        """Returns (text, usage dict) for one prompt."""
+        if self.streaming and run_manager is not None:
+            return self._stream_call(prompt, stop, run_manager, **kwargs)
+
+        stop_to_use = stop[0] if stop and len(stop) == 1 else stop
+        payload = {**self.default_params, "prompt": prompt, "stop": stop_to_use, **kwargs}
+        payload = {k: v for k, v in payload.items() if v is not None}
+
+        response = get_http_session().post(self.base_url, headers=self._headers(), json=payload,
+                                           timeout=(LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT))
+        if response.status_code >= 500:
+            raise Exception(f"Together Server: Error {response.status_code}")
+        elif response.status_code >= 400:
+            raise ValueError(f"Together received an invalid payload: {response.text}")
+        elif response.status_code != 200:
+            raise Exception(f"Together returned an unexpected response with status {response.status_code}: {response.text}")
+
+        data = response.json()
+        if data.get("status") != "finished":
+            raise Exception(data.get("error", "Undefined Error"))
+        return self._format_output(data), data.get("usage") or data.get("output", {}).get("usage") or {}
+
+    def _stream_call(self, prompt, stop, run_manager, **kwargs):
+        payload = {**self.default_params, "prompt": prompt, "stop": stop, "stream": True, **kwargs}
+        payload = {k: v for k, v in payload.items() if v is not None}
+
+        text = []
+        usage = {}
+        with get_http_session().post(TOGETHER_STREAM_URL, headers=self._headers(), json=payload, stream=True,
+                                     timeout=(LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT)) as response:
+            if response.status_code != 200:
+                raise ValueError(f"Together returned status {response.status_code}: {response.text}")
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                # The last chunk carries the usage of the whole completion.
+                usage = chunk.get("usage") or usage
+                choices = chunk.get("choices") or [{}]
+                token = choices[0].get("text") or ""
+                if token:
+                    text.append(token)
+                    run_manager.on_llm_new_token(token)
+        return "".join(text), usage
+
+
+def get_llm(model, temperature=0.0, max_tokens=512, streaming=False, api_key=None):
+    """Returns the shared LLM for (model, temperature, max_tokens, streaming).
+
+    Instances are stateless apart from their settings and all use the pooled session,
+    so one per configuration is enough for every thread in the process.
+    """
+    key = (model, temperature, max_tokens, streaming)
+    with _registry_lock:
+        llm = _llm_registry.get(key)
+        if llm is None:
+            llm = PooledTogether(
+                model=model,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                together_api_key=api_key or os.environ.get("TOGETHER_API_KEY"),
+                streaming=streaming,
+            )
+            _llm_registry[key] = llm
+        return llm
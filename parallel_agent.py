@@ -0,0 +1,137 @@
+import contextvars
+import os
+import re
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+import numpy as np
+from langchain.agents import AgentExecutor, AgentType
+from langchain.agents.mrkl.output_parser import FINAL_ANSWER_ACTION, MRKLOutputParser
+from langchain.agents.types import AGENT_TO_CLASS
+from langchain_core.agents import AgentAction
+
+from semantic_cache import normalize_query
+
+AGENT_TOOL_WORKERS = int(os.environ.get("AGENT_TOOL_WORKERS", 8))
+
+# Separate pools: a tool running on TOOL_EXECUTOR may block on a speculative retrieval,
+# which must never queue behind it.
+TOOL_EXECUTOR = ThreadPoolExecutor(max_workers=AGENT_TOOL_WORKERS, thread_name_prefix="agent-tool")
+SPECULATION_EXECUTOR = ThreadPoolExecutor(max_workers=AGENT_TOOL_WORKERS, thread_name_prefix="agent-speculation")
+
+ACTION_PATTERN = re.compile(
+    r"Action\s*\d*\s*:[\s]*(.*?)[\s]*Action\s*\d*\s*Input\s*\d*\s*:[\s]*(.*?)(?=\n\s*(?:Thought|Action\s*\d*\s*:)|$)",
+    re.DOTALL,
+)
+
+# (raw user input, Future of its retrieved documents) for the agent run in this context.
+_speculation = contextvars.ContextVar("speculation", default=None)
+
+
+class MultiActionOutputParser(MRKLOutputParser):
+    """MRKL parser that also accepts several Action / Action Input pairs in one reply.
+
+    Each pair becomes its own AgentAction so the executor can run them together; the
+    first action's log carries the preceding thought. Single actions and final answers
+    are parsed exactly as before.
+    """
+
+    def parse(self, text):
+        matches = list(ACTION_PATTERN.finditer(text))
+        if len(matches) < 2 or FINAL_ANSWER_ACTION in text:
+            return super().parse(text)
+        actions = []
+        for i, match in enumerate(matches):
+            tool_input = match.group(2).strip(" ").strip('"')
+            log = text[:match.end()] if i == 0 else "\n" + match.group(0)
+            actions.append(AgentAction(match.group(1).strip(), tool_input, log))
+        return actions
+
+
+class ParallelAgentExecutor(AgentExecutor):
+    """AgentExecutor that overlaps work the stock executor does one step at a time.
+
+    - When `speculate` is set, it is started on the raw input as soon as a run begins,
+      so retrieval and rerank proceed while the first planning LLM call is in flight.
+      Tools pick the result up through `speculative_documents`.
+    - When one plan names several tools, they run concurrently on TOOL_EXECUTOR and
+      their observations are fed back together in the original order.
+    """
+
+    speculate: Optional[Callable[[str], Any]] = None
+    parallel_tools: bool = True
+
+    def _call(self, inputs, run_manager=None):
+        if self.speculate is None:
+            return super()._call(inputs, run_manager)
+        query = inputs["input"]
+        # Run in a copy of this context so its spans land in the request's trace.
+        future = SPECULATION_EXECUTOR.submit(contextvars.copy_context().run, self.speculate, query)
+        token = _speculation.set((query, future))
+        try:
+            return super()._call(inputs, run_manager)
+        finally:
+            _speculation.reset(token)
+            future.cancel()
+
+    def _perform_agent_action(self, name_to_tool_map, color_mapping, agent_action, run_manager=None):
+        # AgentExecutor yields every action of a plan before performing any of them, so
+        # returning futures here submits them all before the first one is awaited.
+        if not self.parallel_tools:
+            return super()._perform_agent_action(name_to_tool_map, color_mapping, agent_action, run_manager)
+        context = contextvars.copy_context()
+        return TOOL_EXECUTOR.submit(context.run, super()._perform_agent_action,
+                                    name_to_tool_map, color_mapping, agent_action, run_manager)
+
+    def _iter_next_step(self, name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager=None):
+        futures = []
+        for step in super()._iter_next_step(name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager):
+            if isinstance(step, Future):
+                futures.append(step)
+            else:
+                yield step
+        for future in futures:
+            yield future.result()
+
+
+def initialize_parallel_agent(tools, llm, agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION, agent_kwargs=None,
+                              speculate=None, parallel_tools=True, **kwargs):
+    """Like langchain's `initialize_agent`, but returns a ParallelAgentExecutor."""
+    agent_kwargs = dict(agent_kwargs or {})
+    if agent == AgentType.ZERO_SHOT_REACT_DESCRIPTION:
+        agent_kwargs.setdefault("output_parser", MultiActionOutputParser())
+    agent_obj = AGENT_TO_CLASS[agent].from_llm_and_tools(llm, tools, **agent_kwargs)
+    return ParallelAgentExecutor.from_agent_and_tools(
+        agent=agent_obj, tools=tools, tags=[agent.value], speculate=speculate, parallel_tools=parallel_tools, **kwargs
+    )
+
+
+def queries_match(first, second, embedding_model=None, threshold=0.9):
+    if normalize_query(first) == normalize_query(second):
+        return True
+    if embedding_model is None:
+        return False
+    # embed_query, like the retriever, so both vectors usually come from the embedding cache.
+    vectors = np.asarray([embedding_model.embed_query(first), embedding_model.embed_query(second)], dtype=np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    return float(vectors[0] @ vectors[1]) >= threshold
+
+
+def speculative_documents(query, embedding_model=None, threshold=0.9):
+    """Documents prefetched for the current agent run, if they were fetched for `query`.
+
+    The agent usually rephrases the user's question for the tool, so a prefetch is also
+    used when the two queries embed within `threshold` cosine similarity. Returns None
+    when there is no usable prefetch.
+    """
+    speculation = _speculation.get()
+    if speculation is None:
+        return None
+    prefetched_query, future = speculation
+    if future.cancelled() or not queries_match(prefetched_query, query, embedding_model, threshold):
+        return None
+    try:
+        return future.result()
+    except Exception as e:
+        print(f"Speculative retrieval failed, retrieving again: {e}")
+        return None
@@ -0,0 +1,192 @@
+import multiprocessing
+import os
+import re
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz
+from langchain_core.documents import Document
+
+# Pages are parsed PDF_PAGES_PER_TASK at a time on PDF_PARSE_WORKERS processes and streamed
+# on in page order; at most two tasks per worker are in flight, so a large book is never
+# held in memory at once.
+PDF_PARSE_WORKERS = int(os.environ.get("PDF_PARSE_WORKERS", max(1, (os.cpu_count() or 1) // 2)))
+PDF_PAGES_PER_TASK = int(os.environ.get("PDF_PAGES_PER_TASK", 16))
+
+# Fonts whose name says monospace; many TeX fonts (e.g. Inconsolata) do not set the flag.
+MONOSPACE_FONT_RE = re.compile(r"mono|courier|consol|typewriter|menlo|^cmtt|^sfti?tt|code", re.IGNORECASE)
+MONOSPACE_FLAG = 8
+# A line is a heading when its text is this much larger than the page's body text.
+HEADING_SIZE_RATIO = 1.15
+# Shorter code snippets (one-liners, calls) stay inline with the prose around them.
+MIN_CODE_BLOCK_LINES = 4
+# "Q1.", "Q 2)", "Q:", "Question 3:", "Question:" start a question; the pair runs until
+# the next question or heading.
+QUESTION_RE = re.compile(r"^(?:Q(?:uestion)?\s*\d+\s*[.:)]|Q\s*[.:]|Question\s*:)")
+
+PDF_METADATA_FIELDS = ("format", "title", "author", "subject", "keywords", "creator", "producer",
+                       "creationDate", "modDate", "trapped")
+
+
+def is_code_span(span):
+    return bool(span["flags"] & MONOSPACE_FLAG) or bool(MONOSPACE_FONT_RE.search(span["font"]))
+
+
+def _indent_code(lines):
+    """Restores leading indentation (4 spaces per level) from x offsets; text extraction drops it."""
+    offsets = sorted({round(x0, 1) for x0, _ in lines})
+    steps = [b - a for a, b in zip(offsets, offsets[1:]) if b - a > 1]
+    step = min(steps) if steps else 1
+    return "\n".join(" " * (4 * round((x0 - offsets[0]) / step)) + text for x0, text in lines)
+
+
+def parse_page(page):
+    """Returns the page as [(kind, text)] in reading order, kind being "text", "code" or "heading".
+
+    Consecutive code lines are joined into one "code" entry with their indentation, and
+    page numbers in the bottom margin are dropped.
+    """
+    lines = []
+    sizes = Counter()
+    for block in page.get_text("dict")["blocks"]:
+        if block["type"] != 0:
+            continue
+        for line in block["lines"]:
+            spans = [span for span in line["spans"] if span["text"].strip()]
+            if not spans:
+                continue
+            text = "".join(span["text"] for span in line["spans"]).strip()
+            x0, y0 = line["bbox"][:2]
+            if text.isdigit() and y0 > page.rect.height * 0.9:
+                continue
+            code = all(is_code_span(span) for span in spans)
+            size = min(span["size"] for span in spans)
+            if not code:
+                for span in spans:
+                    sizes[round(span["size"], 1)] += len(span["text"])
+            lines.append((code, size, x0, text))
+
+    body_size = sizes.most_common(1)[0][0] if sizes else 0
+    entries = []
+    code_lines = []
+    heading_size = None
+    for code, size, x0, text in lines:
+        if code:
+            code_lines.append((x0, text))
+            continue
+        if code_lines:
+            entries.append(("code", _indent_code(code_lines)))
+            code_lines = []
+        kind = "heading" if body_size and size >= body_size * HEADING_SIZE_RATIO and len(text) < 100 else "text"
+        if kind == "heading" and entries and entries[-1][0] == "heading" and abs(size - heading_size) < 0.5:
+            # Multi-line headings ("Chapter 3" / "Sorting") read as one.
+            entries[-1] = ("heading", f"{entries[-1][1]} {text}")
+        else:
+            entries.append((kind, text))
+        heading_size = size if kind == "heading" else None
+    if code_lines:
+        entries.append(("code", _indent_code(code_lines)))
+    return entries
+
+
+def parse_pages(path, start, stop):
+    with fitz.open(path) as doc:
+        return [parse_page(doc[number]) for number in range(start, stop)]
+
+
+def iter_parsed_pages(path, page_count):
+    """Yields (page number, entries) in page order, parsing on a process pool for large files."""
+    if PDF_PARSE_WORKERS <= 1 or page_count <= PDF_PAGES_PER_TASK:
+        for start in range(0, page_count, PDF_PAGES_PER_TASK):
+            stop = min(start + PDF_PAGES_PER_TASK, page_count)
+            yield from zip(range(start, stop), parse_pages(path, start, stop))
+        return
+
+    with ProcessPoolExecutor(max_workers=PDF_PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn")) as pool:
+        in_flight = deque()
+        for start in range(0, page_count, PDF_PAGES_PER_TASK):
+            stop = min(start + PDF_PAGES_PER_TASK, page_count)
+            in_flight.append((start, pool.submit(parse_pages, path, start, stop)))
+            if len(in_flight) >= PDF_PARSE_WORKERS * 2:
+                done_start, future = in_flight.popleft()
+                yield from enumerate(future.result(), done_start)
+        while in_flight:
+            done_start, future = in_flight.popleft()
+            yield from enumerate(future.result(), done_start)
+
+
+def iter_pdf_documents(path):
+    """Yields the PDF as layout-aware Documents.
+
+    Prose becomes one Document per page and section (record_type "text"). Each code
+    block of MIN_CODE_BLOCK_LINES or more (record_type "code"), with its section and the
+    sentence introducing it as "heading" metadata, and each question with its answer
+    (record_type "qa") becomes a Document of its own, also when it runs over a page
+    break, so the chunker can keep it whole. "page" is the 0-based page the Document starts on,
+    as with PyMuPDFLoader.
+    """
+    with fitz.open(path) as doc:
+        page_count = doc.page_count
+        base_metadata = {key: doc.metadata.get(key) for key in PDF_METADATA_FIELDS if doc.metadata.get(key) is not None}
+    base_metadata.update(source=path, file_path=path, file_type="pdf", total_pages=page_count)
+
+    section = ""
+    # The open segment: [record_type, first page, lines, lead-in]
+    current = None
+    # Prose lines since the last code snippet, for the lead-in of the next code block.
+    prose = []
+
+    def flush():
+        if current is None or not any(line.strip() for line in current[2]):
+            return None
+        record_type, page, lines, lead_in = current
+        metadata = dict(base_metadata, page=page, record_type=record_type)
+        if section:
+            metadata["section"] = section
+        if record_type == "code":
+            # simplerag.split_documents puts the heading on top of every chunk of the block.
+            heading = "\n".join(part for part in (f"Section: {section}" if section else "", lead_in) if part)
+            if heading:
+                metadata["heading"] = heading
+        return Document(page_content="\n".join(lines).strip(), metadata=metadata)
+
+    for page_number, entries in iter_parsed_pages(path, page_count):
+        # Prose is cut at page breaks to keep page numbers exact; code and Q&A carry on.
+        if current is not None and current[0] == "text":
+            document = flush()
+            if document is not None:
+                yield document
+            current = None
+        for kind, text in entries:
+            inline_code = kind == "code" and text.count("\n") + 1 < MIN_CODE_BLOCK_LINES
+            if inline_code:
+                kind = "text"
+            question = kind == "text" and bool(QUESTION_RE.match(text))
+            lead_in = ""
+            if kind == "code" and current is not None and current[0] == "text":
+                # "... the following function sorts strings by length:" describes the code.
+                last_sentence = re.split(r"(?<=[.!?])\s+", " ".join(prose))[-1]
+                if last_sentence.endswith(":") and len(last_sentence) <= 300:
+                    lead_in = last_sentence
+            if kind == "text" and not inline_code:
+                prose.append(text)
+            else:
+                prose = []
+
+            # Headings and questions start a new segment; so does every switch between prose
+            # and code, except inside a Q&A pair.
+            if current is not None and (kind == "heading" or question or
+                                        (current[0] != "qa" and (kind == "code") != (current[0] == "code"))):
+                document = flush()
+                if document is not None:
+                    yield document
+                current = None
+            if kind == "heading":
+                section = text
+            if current is None:
+                record_type = "code" if kind == "code" else "qa" if question else "text"
+                current = [record_type, page_number, [], lead_in]
+            current[2].append(text)
+    document = flush()
+    if document is not None:
+        yield document
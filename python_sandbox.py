@@ -0,0 +1,307 @@
+import json
+import os
+import queue
+import select
+import shutil
+import signal
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+SANDBOX_WORKERS = int(os.environ.get("SANDBOX_WORKERS", 2))
+SANDBOX_CPU_SECONDS = int(os.environ.get("SANDBOX_CPU_SECONDS", 5))
+SANDBOX_WALL_SECONDS = float(os.environ.get("SANDBOX_WALL_SECONDS", 10))
+SANDBOX_MEMORY_MB = int(os.environ.get("SANDBOX_MEMORY_MB", 256))
+SANDBOX_MAX_OUTPUT = int(os.environ.get("SANDBOX_MAX_OUTPUT", 10000))
+SANDBOX_MAX_CALLS = int(os.environ.get("SANDBOX_MAX_CALLS", 100))
+
+# Imported once by each worker so every forked run starts with them already loaded.
+PRELOADED_MODULES = ("bisect", "collections", "functools", "heapq", "itertools", "math", "random", "re", "string")
+
+_HEADER = struct.Struct("!I")
+
+
+def _send(stream, message):
+    data = json.dumps(message).encode("utf-8")
+    stream.write(_HEADER.pack(len(data)) + data)
+    stream.flush()
+
+
+def _read_exact(stream, size):
+    data = b""
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            raise EOFError("sandbox pipe closed")
+        data += chunk
+    return data
+
+
+def _receive(stream):
+    (length,) = _HEADER.unpack(_read_exact(stream, _HEADER.size))
+    return json.loads(_read_exact(stream, length).decode("utf-8"))
+
+
+# ---- Worker side: runs in the pre-started subprocess -------------------------------------
+
+def _run_child(code, capture_fd, limits, workdir):
+    import resource
+
+    os.setpgid(0, 0)
+    os.chdir(workdir)
+    os.dup2(capture_fd, 1)
+    os.dup2(capture_fd, 2)
+    memory = limits["memory_mb"] * 1024 * 1024
+    # SIGXCPU at the soft limit; the hard limit SIGKILLs code that catches it.
+    resource.setrlimit(resource.RLIMIT_CPU, (limits["cpu_seconds"], limits["cpu_seconds"] + 1))
+    resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (1024 * 1024, 1024 * 1024))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+
+    sys.stdout = os.fdopen(1, "w", buffering=1, closefd=False)
+    sys.stderr = os.fdopen(2, "w", buffering=1, closefd=False)
+    exit_code = 0
+    try:
+        exec(compile(code, "<sandbox>", "exec"), {"__name__": "__main__", "__builtins__": __builtins__})
+    except SystemExit as e:
+        # As the interpreter does: sys.exit(None) is success, a message goes to stderr and exits 1.
+        if isinstance(e.code, int):
+            exit_code = e.code
+        elif e.code is not None:
+            print(e.code, file=sys.stderr)
+            exit_code = 1
+    except BaseException as e:
+        # Drop this frame so the traceback starts at the user's code.
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        exit_code = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    os._exit(exit_code)
+
+
+def _execute(request, protocol_fds=()):
+    """Forks a child for one snippet and collects its capped output within the wall time."""
+    read_fd, write_fd = os.pipe()
+    workdir = tempfile.mkdtemp(prefix="sandbox-")
+    start = time.monotonic()
+    pid = os.fork()
+    if pid == 0:
+        for fd in (read_fd, *protocol_fds):
+            os.close(fd)
+        _run_child(request["code"], write_fd, request, workdir)
+    os.close(write_fd)
+
+    output = bytearray()
+    status = None
+    deadline = start + request["wall_seconds"]
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            status = "timeout"
+            break
+        ready, _, _ = select.select([read_fd], [], [], remaining)
+        if not ready:
+            continue
+        data = os.read(read_fd, 65536)
+        if not data:
+            break
+        output.extend(data)
+        if len(output) > request["max_output"]:
+            status = "output_limit"
+            break
+    if status is not None:
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            os.kill(pid, signal.SIGKILL)
+    os.close(read_fd)
+    _, wait_status = os.waitpid(pid, 0)
+    if status is None:
+        if os.WIFSIGNALED(wait_status) and os.WTERMSIG(wait_status) in (signal.SIGXCPU, signal.SIGKILL):
+            status = "cpu_limit"
+        elif os.WIFSIGNALED(wait_status):
+            status = f"signal {os.WTERMSIG(wait_status)}"
+        elif os.WEXITSTATUS(wait_status) != 0:
+            status = f"exit code {os.WEXITSTATUS(wait_status)}"
+        else:
+            status = "ok"
+    shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "status": status,
+        "output": bytes(output[:request["max_output"]]).decode("utf-8", errors="replace"),
+        "seconds": time.monotonic() - start,
+    }
+
+
+def _worker_main():
+    for name in PRELOADED_MODULES:
+        __import__(name)
+    # Keep the protocol pipes on private descriptors so forked snippets cannot reach them.
+    requests_in = os.fdopen(os.dup(0), "rb")
+    responses_out = os.fdopen(os.dup(1), "wb")
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    protocol_fds = (requests_in.fileno(), responses_out.fileno())
+
+    _send(responses_out, {"ready": True})
+    while True:
+        try:
+            request = _receive(requests_in)
+        except EOFError:
+            return
+        try:
+            response = _execute(request, protocol_fds)
+        except Exception as e:
+            response = {"status": "error", "output": f"Sandbox error: {e}", "seconds": 0.0}
+        _send(responses_out, response)
+
+
+# ---- Pool side: runs in the web/agent process --------------------------------------------
+
+class SandboxWorker:
+    def __init__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, "-I", os.path.abspath(__file__)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, bufsize=0, start_new_session=True,
+        )
+        self.calls = 0
+        try:
+            _receive(self.process.stdout)  # wait for "ready"
+        except Exception:
+            self.kill()
+            raise
+
+    def execute(self, request, timeout):
+        _send(self.process.stdin, request)
+        # The worker enforces the wall time itself; this only catches a wedged worker.
+        ready, _, _ = select.select([self.process.stdout], [], [], timeout)
+        if not ready:
+            raise TimeoutError("sandbox worker did not answer")
+        self.calls += 1
+        return _receive(self.process.stdout)
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def kill(self):
+        try:
+            self.process.kill()
+            self.process.wait(timeout=5)
+        except Exception:
+            pass
+
+
+class SandboxPool:
+    """Pre-started pool of subprocess workers that run untrusted Python snippets.
+
+    Each worker is an idle interpreter with common modules imported. Every snippet runs
+    in a child forked from it, so it pays no interpreter start-up, gets fresh globals,
+    and is held to hard rlimits on CPU time and address space plus a wall-time kill
+    and an output cap. A worker is recycled after `max_calls` snippets or when it
+    misbehaves, and its replacement is started in the background; a replacement that
+    fails to start is retried on the next call.
+
+    This protects the serving process from runaway code; it is not a security
+    boundary against hostile code (no filesystem or network isolation).
+    """
+
+    def __init__(self, size=SANDBOX_WORKERS, cpu_seconds=SANDBOX_CPU_SECONDS, wall_seconds=SANDBOX_WALL_SECONDS,
+                 memory_mb=SANDBOX_MEMORY_MB, max_output=SANDBOX_MAX_OUTPUT, max_calls=SANDBOX_MAX_CALLS):
+        self.pid = os.getpid()
+        self.limits = {"cpu_seconds": cpu_seconds, "wall_seconds": wall_seconds,
+                       "memory_mb": memory_mb, "max_output": max_output}
+        self.max_calls = max_calls
+        self.idle = queue.Queue()
+        # Workers that could not be started, retried by the next execute().
+        self.missing = 0
+        self._lock = threading.Lock()
+        for _ in range(size):
+            self._spawn()
+
+    def _spawn(self):
+        try:
+            self.idle.put(SandboxWorker())
+        except Exception as e:
+            print(f"Could not start a sandbox worker: {e}")
+            with self._lock:
+                self.missing += 1
+
+    def _replace(self, worker):
+        worker.kill()
+        self._spawn()
+
+    def execute(self, code):
+        """Runs `code` and returns {"status", "output", "seconds"}."""
+        with self._lock:
+            missing, self.missing = self.missing, 0
+        for _ in range(missing):
+            threading.Thread(target=self._spawn, daemon=True).start()
+        # A busy worker answers within the wall time, so waiting longer means none is coming.
+        try:
+            worker = self.idle.get(timeout=self.limits["wall_seconds"] + 5)
+        except queue.Empty:
+            return {"status": "error", "output": "No sandbox worker became available.", "seconds": 0.0}
+        try:
+            response = worker.execute({"code": code, **self.limits}, timeout=self.limits["wall_seconds"] + 5)
+        except Exception as e:
+            threading.Thread(target=self._replace, args=(worker,), daemon=True).start()
+            return {"status": "error", "output": f"Sandbox worker failed: {e}", "seconds": 0.0}
+        if worker.calls >= self.max_calls or not worker.alive():
+            threading.Thread(target=self._replace, args=(worker,), daemon=True).start()
+        else:
+            self.idle.put(worker)
+        return response
+
+    def run(self, code):
+        """Runs `code` and returns its output with a note when a limit was hit."""
+        response = self.execute(code)
+        output = response["output"]
+        status = response["status"]
+        if status == "timeout":
+            output += f"\n[Execution stopped: exceeded the {self.limits['wall_seconds']}s time limit]"
+        elif status == "cpu_limit":
+            output += f"\n[Execution stopped: exceeded the {self.limits['cpu_seconds']}s CPU time limit]"
+        elif status == "output_limit":
+            output += f"\n[Output truncated after {self.limits['max_output']} characters]"
+        elif status != "ok":
+            output += f"\n[Execution failed: {status}]"
+        return output
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().kill()
+            except queue.Empty:
+                return
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_sandbox_pool():
+    """Process-wide SandboxPool, started on first use (again after a fork)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = SandboxPool()
+        return _pool
+
+
+def close_sandbox_pool():
+    """Stops this process's workers, e.g. in the gunicorn master before it forks."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool.pid == os.getpid():
+            _pool.close()
+        _pool = None
+
+
+if __name__ == "__main__":
+    _worker_main()
@@ -1,25 +1,29 @@
 from dotenv import load_dotenv , find_dotenv
 import os
 
-from langchain_huggingface import HuggingFaceEmbeddings 
 
 
 from langchain_community.vectorstores import FAISS
 from langchain_core.prompts import PromptTemplate
 from langchain.chains import RetrievalQA
-from langchain.agents import initialize_agent,Tool,AgentType
-from langchain.retrievers.document_compressors import FlashrankRerank
-from langchain_experimental.tools.python.tool import PythonREPLTool 
+from langchain.agents import Tool,AgentType
+from langchain_experimental.tools.python.tool import sanitize_input
 from langchain.retrievers import ContextualCompressionRetriever
-from flashrank import Ranker
-import uuid 
-
-from langchain.retrievers.document_compressors import CohereRerank
-from langchain_cohere import CohereRerank
-from langchain_community.llms import Together
-import requests
-import base64
-from together import Together as TogetherClient
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from langchain_core.callbacks import BaseCallbackHandler
+from semantic_cache import SemanticCache
+from llm_clients import get_llm
+from hybrid_search import BM25Index, HybridRetriever, BM25_INDEX_FILENAME
+from vector_index import index_filename, read_index_mmap, configure_search
+from chunk_store import ChunkStore, ChunkPositions, CHUNK_STORE_FILENAME
+from intent_router import FINAL_ANSWER_TAG, IntentRouter, RoutedAgent
+from parallel_agent import initialize_parallel_agent, speculative_documents
+from python_sandbox import get_sandbox_pool
+from tracing import TracedCompressor, TracedEmbeddings, record_cache, span
+from embedding_cache import (CachedEmbeddings, EMBEDDING_BACKEND, EMBEDDING_MODEL_NAME, EMBEDDING_ONNX_QUANTIZATION,
+                             load_embedding_model, read_warm_queries)
 
 import warnings # <--- Add this line!
 
@@ -40,45 +44,165 @@ TOGETHER_MODEL_ID = "meta-llama/Llama-3.3-70B-Instruct-Turbo"
 
 DB_FAISS_PATH = "vectorstore/db_faiss"
 
+# Semantic answer cache in front of the Knowledge Base tool. Set SEMANTIC_CACHE_PATH to a
+# SQLite file to share entries between gunicorn workers and keep them across restarts.
+SEMANTIC_CACHE_ENABLED = os.environ.get("SEMANTIC_CACHE_ENABLED", "1") != "0"
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", 0.95))
+SEMANTIC_CACHE_MAX_SIZE = int(os.environ.get("SEMANTIC_CACHE_MAX_SIZE", 2000))
+SEMANTIC_CACHE_TTL = int(os.environ.get("SEMANTIC_CACHE_TTL", 7 * 24 * 3600))
+SEMANTIC_CACHE_PATH = os.environ.get("SEMANTIC_CACHE_PATH") or None
+
+# Query embedding cache (in-process LRU; EMBEDDING_CACHE_SIZE=0 disables it). Set
+# EMBEDDING_CACHE_PATH to a SQLite file to share vectors between workers and restarts.
+# At start-up the EMBEDDING_WARM_TOP_N most frequent stored queries are loaded, plus the
+# queries in EMBEDDING_WARM_FILE (.txt, one per line, or .jsonl) not cached yet.
+EMBEDDING_CACHE_SIZE = int(os.environ.get("EMBEDDING_CACHE_SIZE", 10000))
+EMBEDDING_CACHE_PATH = os.environ.get("EMBEDDING_CACHE_PATH") or None
+EMBEDDING_WARM_TOP_N = int(os.environ.get("EMBEDDING_WARM_TOP_N", 500))
+EMBEDDING_WARM_FILE = os.environ.get("EMBEDDING_WARM_FILE") or None
+
+# Which index simplerag.py built to serve from ("flat", "ivf_flat", "ivf_pq", "hnsw", "sq8").
+# Indexes are memory-mapped read-only, so all workers share one page-cached copy.
+FAISS_INDEX_TYPE = os.environ.get("FAISS_INDEX_TYPE", "flat")
+FAISS_NPROBE = int(os.environ.get("FAISS_NPROBE", 16))
+FAISS_EF_SEARCH = int(os.environ.get("FAISS_EF_SEARCH", 64))
+
+
+def load_faiss_index(expected_size):
+    path = os.path.join(DB_FAISS_PATH, index_filename(FAISS_INDEX_TYPE))
+    flat_path = os.path.join(DB_FAISS_PATH, "index.faiss")
+    if FAISS_INDEX_TYPE != "flat":
+        if not os.path.exists(path):
+            print(f"FAISS index type '{FAISS_INDEX_TYPE}' not built ({path} missing), falling back to flat.")
+        elif os.path.getmtime(path) < os.path.getmtime(flat_path):
+            # Built from an older flat index: its row positions may no longer match the chunks.
+            print(f"FAISS index '{path}' is older than index.faiss, falling back to flat. Rebuild it with FAISS_BUILD_INDEX_TYPES.")
+        else:
+            index = read_index_mmap(path, FAISS_INDEX_TYPE)
+            if index.ntotal == expected_size:
+                return configure_search(index, nprobe=FAISS_NPROBE, ef_search=FAISS_EF_SEARCH)
+            print(f"FAISS index '{path}' is stale ({index.ntotal} vectors, expected {expected_size}), falling back to flat.")
+    return read_index_mmap(flat_path)
+
+
 def get_vectorstore_instance():
    
     try:
-        embedding_model = HuggingFaceEmbeddings(model_name = "BAAI/bge-small-en")
-        db = FAISS.load_local(DB_FAISS_PATH, embedding_model, allow_dangerous_deserialization=True)
+        # Loading the embedding model (torch import + weights) dominates start-up, so it
+        # runs in a thread while the chunk store and index are opened.
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            embedding_future = executor.submit(load_embedding_model, EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND)
+            # No pickle on this path: chunks are read lazily from SQLite and the index is memory-mapped.
+            chunk_store_path = os.path.join(DB_FAISS_PATH, CHUNK_STORE_FILENAME)
+            if not os.path.exists(chunk_store_path):
+                raise FileNotFoundError(f"{chunk_store_path} not found. Run `python simplerag.py` to build it (an existing index.pkl store is migrated; only chunks whose text changed are re-embedded).")
+            chunk_store = ChunkStore(chunk_store_path, read_only=True)
+            positions = ChunkPositions(chunk_store)
+            index = load_faiss_index(len(positions))
+            embedding_model = embedding_future.result()
+        # Every query embedding (retrieval, router, semantic cache) that misses the cache is
+        # timed as an "embed" span.
+        embeddings = TracedEmbeddings(embedding_model)
+        if EMBEDDING_CACHE_SIZE > 0:
+            model_id = f"{EMBEDDING_MODEL_NAME}:{EMBEDDING_BACKEND}"
+            if EMBEDDING_BACKEND == "onnx-int8":
+                model_id += f":{EMBEDDING_ONNX_QUANTIZATION}"
+            embeddings = CachedEmbeddings(embeddings, model_id, max_size=EMBEDDING_CACHE_SIZE, path=EMBEDDING_CACHE_PATH)
+            warmed = embeddings.warm(EMBEDDING_WARM_TOP_N, read_warm_queries(EMBEDDING_WARM_FILE))
+            if warmed:
+                print(f"Embedding cache warmed with {warmed} queries.")
+        db = FAISS(embeddings, index, chunk_store, positions)
         return db
     except Exception as e:
         print(f"Error loading FAISS vector store: {e}") # Use print, not st.error
         return None
 
 
-if not COHERE_API_KEY:  
-    print("Error: COHERE_API_KEY environment variable not set. Please set it in your .env file.")
-    exit()
-
-def load_llm(together_model_id,temperature:float=0.0):
-
-    llm = Together(
-        model = together_model_id,
-        temperature = temperature,
-        max_tokens = 512,
-        together_api_key = TOGETHER_API_KEY
+# Reranker applied to the retrieved candidates: "cohere" (remote API), "flashrank" (local
+# ONNX cross-encoder, works offline) or "none". Defaults to cohere when a key is configured.
+RERANKER = os.environ.get("RERANKER", "cohere" if COHERE_API_KEY else "flashrank").lower()
+RETRIEVAL_K = int(os.environ.get("RETRIEVAL_K", 25))
+RERANK_TOP_N = int(os.environ.get("RERANK_TOP_N", 5))
+FLASHRANK_MODEL = os.environ.get("FLASHRANK_MODEL", "ms-marco-TinyBERT-L-2-v2")
+FLASHRANK_CACHE_DIR = os.environ.get("FLASHRANK_CACHE_DIR", "vectorstore/flashrank")
+FLASHRANK_MAX_LENGTH = int(os.environ.get("FLASHRANK_MAX_LENGTH", 256))
+
+# Hybrid retrieval fuses FAISS with the BM25 index that simplerag.py writes next to it.
+HYBRID_RETRIEVAL = os.environ.get("HYBRID_RETRIEVAL", "1") != "0"
+BM25_INDEX_PATH = os.path.join(DB_FAISS_PATH, BM25_INDEX_FILENAME)
+
+# Intent router in front of the agent: plain knowledge questions go straight to the RAG
+# chain and out-of-domain ones get the refusal without any LLM call. Ambiguous queries
+# (margin below INTENT_ROUTER_MARGIN) always fall through to the ReAct agent.
+INTENT_ROUTER_ENABLED = os.environ.get("INTENT_ROUTER_ENABLED", "1") != "0"
+INTENT_ROUTER_MARGIN = float(os.environ.get("INTENT_ROUTER_MARGIN", 0.03))
+INTENT_ROUTER_OOD_THRESHOLD = float(os.environ.get("INTENT_ROUTER_OOD_THRESHOLD", 0.80))
+OUT_OF_DOMAIN_ANSWER = "I am specialized in Data Structures and Algorithms and can only answer questions related to that domain. I cannot answer general knowledge questions."
+
+# Agent execution: retrieval for the raw input starts while the first planning call is in
+# flight, and tools named together in one plan run concurrently. The Knowledge Base tool
+# reuses the prefetch when its query matches the input (SPECULATIVE_MATCH_THRESHOLD).
+SPECULATIVE_RETRIEVAL = os.environ.get("SPECULATIVE_RETRIEVAL", "1") != "0"
+SPECULATIVE_MATCH_THRESHOLD = float(os.environ.get("SPECULATIVE_MATCH_THRESHOLD", 0.90))
+AGENT_PARALLEL_TOOLS = os.environ.get("AGENT_PARALLEL_TOOLS", "1") != "0"
+
+# LangChain's verbose agent output and the per-query source dumps. Off by default: request
+# timing is reported by tracing.py (TRACE_LOG, /metrics) instead.
+AGENT_VERBOSE = os.environ.get("AGENT_VERBOSE", "0") != "0"
+
+
+@lru_cache(maxsize=None)
+def get_reranker(reranker=RERANKER, top_n=RERANK_TOP_N):
+    """Returns the document compressor for `reranker`, or None when reranking is disabled.
+
+    Cached, so it can be warmed up in parallel with the vector store at start-up. The
+    backend's SDK is only imported when that backend is selected.
+    """
+    if reranker == "none":
+        return None
+    if reranker == "cohere":
+        if not COHERE_API_KEY:
+            raise ValueError("RERANKER=cohere needs COHERE_API_KEY. Set it in your .env file or use RERANKER=flashrank.")
+        from langchain_cohere import CohereRerank
+        return CohereRerank(model="rerank-english-v3.0", top_n=top_n)
+    if reranker == "flashrank":
+        from flashrank import Ranker
+        from langchain.retrievers.document_compressors import FlashrankRerank
+        # One Ranker per process; it scores all candidates in a single batched ONNX forward pass.
+        ranker = Ranker(model_name=FLASHRANK_MODEL, cache_dir=FLASHRANK_CACHE_DIR, max_length=FLASHRANK_MAX_LENGTH)
+        return FlashrankRerank(client=ranker, model=FLASHRANK_MODEL, top_n=top_n)
+    raise ValueError(f"Unknown RERANKER '{reranker}', expected one of: cohere, flashrank, none.")
+
+
+def get_base_retriever(db_instance, k, hybrid=HYBRID_RETRIEVAL, bm25_index=None):
+    """Dense FAISS search, fused with BM25 when `hybrid` and a BM25 index is available.
+
+    `bm25_index` defaults to the one simplerag.py wrote next to the FAISS store.
+    """
+    if hybrid and bm25_index is None and os.path.exists(BM25_INDEX_PATH):
+        bm25_index = BM25Index.load(BM25_INDEX_PATH)
+        print(f"Hybrid retrieval enabled (BM25 index with {len(bm25_index)} chunks, fused with reciprocal rank fusion).")
+    return HybridRetriever(vectorstore=db_instance, bm25_index=bm25_index if hybrid else None, k=k, dense_k=k, sparse_k=k)
+
+
+def get_retriever(db_instance, reranker=RERANKER, retrieval_k=RETRIEVAL_K, top_n=RERANK_TOP_N,
+                  hybrid=HYBRID_RETRIEVAL, bm25_index=None):
+    """The Knowledge Base retriever; the arguments let the retrieval benchmark vary the configuration."""
+    compressor = get_reranker(reranker, top_n)
+    if compressor is None:
+        return get_base_retriever(db_instance, top_n, hybrid, bm25_index)
+
+    base_retriever = get_base_retriever(db_instance, retrieval_k, hybrid, bm25_index)
+    return ContextualCompressionRetriever(
+        base_compressor=TracedCompressor(compressor=compressor),
+        base_retriever=base_retriever
     )
-    return llm
-def get_dsa_agent(db_instance):
-        if db_instance is None:
-            raise ValueError("Database instance cannot be None when initializing agent.")
-
-        base_retriever = db_instance.as_retriever(search_kwargs={"k":25})
-        compressor = CohereRerank(model="rerank-english-v3.0", top_n=5)
-
-        compression_retriever = ContextualCompressionRetriever(
-            base_compressor=compressor,
-            base_retriever=base_retriever
-        )
 
 
-        strict_qa_prompt = PromptTemplate(
-            template="""You are an AI assistant specialized in Data Structures and Algorithms (DSA).
+# Answers strictly from the retrieved context; shared by the agent's Knowledge Base tool
+# and the batch answerer.
+STRICT_QA_PROMPT = PromptTemplate(
+    template="""You are an AI assistant specialized in Data Structures and Algorithms (DSA).
             Use the following pieces of context from DSA-related documents to answer the question at the end.
             If the answer cannot be found *explicitly* within the provided context, please state: "I cannot answer this question based on the provided DSA knowledge base."
             Do NOT use your internal knowledge or general information. Stick strictly to the provided context.
@@ -91,20 +215,97 @@ def get_dsa_agent(db_instance):
             {question}
 
             Helpful Answer:""",
-            input_variables=["context", "question"]
-        )
+    input_variables=["context", "question"]
+)
+
+
+def load_llm(together_model_id,temperature:float=0.0,streaming:bool=False):
+    # Shared per (model, temperature, max_tokens, streaming): every chain, agent and tool
+    # call reuses the same instance and the process-wide keep-alive connection pool.
+    return get_llm(together_model_id, temperature=temperature, max_tokens=512,
+                   streaming=streaming, api_key=TOGETHER_API_KEY)
+
+
+class AgentEventCallbackHandler(BaseCallbackHandler):
+    """Forwards agent progress to `emit(event, data)` while a run is in flight.
+
+    Emits a "step" event when a tool is chosen and when its observation is ready, and
+    "token" events for the text the agent LLM writes after "Final Answer:". LLM runs
+    tagged FINAL_ANSWER_TAG (the routed Knowledge Base answer) stream all their text.
+    """
+
+    FINAL_ANSWER_PREFIX = "Final Answer:"
+
+    def __init__(self, emit):
+        self.emit = emit
+        self._buffers = {}
+        self._streaming_final = {}
+
+    def on_llm_start(self, serialized, prompts, *, run_id, tags=None, **kwargs):
+        self._buffers[run_id] = ""
+        if tags and FINAL_ANSWER_TAG in tags:
+            self._streaming_final[run_id] = False
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        if run_id not in self._streaming_final:
+            buffer = self._buffers.get(run_id, "") + token
+            self._buffers[run_id] = buffer
+            position = buffer.find(self.FINAL_ANSWER_PREFIX)
+            if position == -1:
+                return
+            self._streaming_final[run_id] = False
+            token = buffer[position + len(self.FINAL_ANSWER_PREFIX):]
+
+        if not self._streaming_final[run_id]:
+            # Drop the whitespace between "Final Answer:" and the answer itself.
+            token = token.lstrip()
+            if not token:
+                return
+            self._streaming_final[run_id] = True
+        self.emit("token", {"text": token})
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._buffers.pop(run_id, None)
+        self._streaming_final.pop(run_id, None)
+
+    def on_agent_action(self, action, **kwargs):
+        self.emit("step", {"type": "tool_start", "tool": action.tool, "input": str(action.tool_input)})
+
+    def on_tool_end(self, output, *, name=None, **kwargs):
+        self.emit("step", {"type": "observation", "tool": name, "output": str(output)[:500]})
+
+    def on_tool_error(self, error, *, name=None, **kwargs):
+        self.emit("step", {"type": "tool_error", "tool": name, "error": str(error)})
+def get_dsa_agent(db_instance):
+        if db_instance is None:
+            raise ValueError("Database instance cannot be None when initializing agent.")
 
+        compression_retriever = get_retriever(db_instance)
+
+
+        # Streaming, so a routed Knowledge Base answer reaches /chat/stream token by token.
         qa_chain = RetrievalQA.from_chain_type(
-            llm = load_llm(TOGETHER_MODEL_ID),
+            llm = load_llm(TOGETHER_MODEL_ID, streaming=True),
             chain_type = "stuff",
             retriever = compression_retriever,
             return_source_documents = True,
-            chain_type_kwargs = {"prompt":strict_qa_prompt}
+            chain_type_kwargs = {"prompt":STRICT_QA_PROMPT}
         )
-        print("RAG chain with re-ranking (compression_retriever) ready.")
+        print(f"RAG chain with re-ranking (compression_retriever, reranker={RERANKER}) ready.")
+
+        semantic_cache = None
+        if SEMANTIC_CACHE_ENABLED:
+            semantic_cache = SemanticCache(
+                db_instance.embeddings,
+                threshold=SEMANTIC_CACHE_THRESHOLD,
+                max_size=SEMANTIC_CACHE_MAX_SIZE,
+                ttl_seconds=SEMANTIC_CACHE_TTL,
+                path=SEMANTIC_CACHE_PATH
+            )
+            print(f"Semantic answer cache enabled (threshold={SEMANTIC_CACHE_THRESHOLD}, disk={SEMANTIC_CACHE_PATH}).")
 
 
-        def get_knowledge_from_rag(query:str) -> str:
+        def get_knowledge_from_rag(query:str, callbacks=None) -> str:
             """
             Useful for answering questions about programming concepts, algorithms,
             data structures, and retrieving relevant code snippets from stored books and JSON documents.
@@ -112,18 +313,40 @@ def get_dsa_agent(db_instance):
             that should be within your learned knowledge (from your books/JSONs).
             """
 
-            response = qa_chain.invoke({"query":query})
-            print("\n--- RAG Source Documents (Retrieved) ---")
-
-            if "source_documents" in response and response["source_documents"]:
-                # Print details for the first 2 documents
-                for i, doc in enumerate(response["source_documents"][:2]): # Get only top 2 docs
-                    source_info = doc.metadata.get('source', 'N/A')
-                    print(f"Doc {i+1} (Source: {source_info}): {doc.page_content[:150]}...") # Print first 150 chars
-            else:
-
-                print("No relevant source documents found for this query in the knowledge base.")
-            print("--- End Source Documents ---\n")
+            response = None
+            if semantic_cache:
+                with span("cache", "semantic") as attributes:
+                    response = semantic_cache.lookup(query)
+                    attributes.update(record_cache("semantic", response is not None))
+            if response is None:
+                documents = None
+                if SPECULATIVE_RETRIEVAL:
+                    with span("cache", "speculative") as attributes:
+                        documents = speculative_documents(query, db_instance.embeddings, SPECULATIVE_MATCH_THRESHOLD)
+                        attributes.update(record_cache("speculative", documents is not None))
+                if documents is not None:
+                    answer = qa_chain.combine_documents_chain.invoke({"input_documents": documents, "question": query},
+                                                                     config={"callbacks": callbacks})
+                    response = {"query": query, "result": answer["output_text"], "source_documents": documents}
+                else:
+                    response = qa_chain.invoke({"query":query}, config={"callbacks": callbacks})
+                if semantic_cache and response.get("result"):
+                    try:
+                        semantic_cache.store(query, response["result"], response.get("source_documents"))
+                    except Exception as e:
+                        print(f"Semantic cache store failed: {e}")
+            if AGENT_VERBOSE:
+                print("\n--- RAG Source Documents (Retrieved) ---")
+
+                if "source_documents" in response and response["source_documents"]:
+                    # Print details for the first 2 documents
+                    for i, doc in enumerate(response["source_documents"][:2]): # Get only top 2 docs
+                        source_info = doc.metadata.get('source', 'N/A')
+                        print(f"Doc {i+1} (Source: {source_info}): {doc.page_content[:150]}...") # Print first 150 chars
+                else:
+
+                    print("No relevant source documents found for this query in the knowledge base.")
+                print("--- End Source Documents ---\n")
 
             return response["result"]
 
@@ -177,15 +400,23 @@ def get_dsa_agent(db_instance):
         print("Tool: 'Code Generator' defined using direct LLM call (with internal prompt string).")
 
 
-        python_repl_tool = PythonREPLTool(
+        # Code runs in pre-started, resource-limited subprocess workers, never in this
+        # process (limits: SANDBOX_* environment variables).
+        sandbox_pool = get_sandbox_pool()
+
+        def run_python_sandboxed(code: str) -> str:
+            return get_sandbox_pool().run(sanitize_input(code))
+
+        python_repl_tool = Tool(
             name = "Python REPL",
+            func = run_python_sandboxed,
             description="""Executes Python code. Input: single string of Python code. **Use `print()` for output.**
             Output: code execution result.
             Use for testing, debugging, and demonstrating output.
             Do NOT generate code or perform unrelated math.
             """
         )
-        print("Tool: 'Python REPL' defined.")
+        print(f"Tool: 'Python REPL' defined (sandboxed, {sandbox_pool.idle.qsize()} workers).")
 
 
 
@@ -255,12 +486,14 @@ def get_dsa_agent(db_instance):
 
         ]
             
-        agent = initialize_agent(
+        agent = initialize_parallel_agent(
             tools=tools,
-            llm = load_llm(TOGETHER_MODEL_ID),
+            llm = load_llm(TOGETHER_MODEL_ID, streaming=True),
             agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
-            verbose = True,
+            verbose = AGENT_VERBOSE,
             handle_parsing_errors = True,
+            speculate = compression_retriever.invoke if SPECULATIVE_RETRIEVAL else None,
+            parallel_tools = AGENT_PARALLEL_TOOLS,
             agent_kwargs={
             "prefix": """You are an expert Data Structures and Algorithms (DSA) tutor and problem-solver.
             You have access to the following tools:""",
@@ -279,6 +512,8 @@ def get_dsa_agent(db_instance):
             ... (This Thought/Action/Action Input/Observation sequence can repeat multiple times if necessary.
             Ensure that when you use a tool, you provide the `Action Input` in the exact format required by the tool's description.) ...
 
+            If several tools are needed and their inputs do not depend on each other's results (e.g. Knowledge Base for an explanation and ASCII Visualizer for its diagram), write all their Action/Action Input pairs one after another before the Observation. They run at the same time and every Observation is returned together.
+
             Thought: Now that I have all the information, I can provide a final answer.
 
             
@@ -329,7 +564,13 @@ def get_dsa_agent(db_instance):
                     ]
             }
         )
-        return agent
+        if not INTENT_ROUTER_ENABLED:
+            return agent
+
+        router = IntentRouter(db_instance.embeddings, margin=INTENT_ROUTER_MARGIN,
+                              out_of_domain_threshold=INTENT_ROUTER_OOD_THRESHOLD)
+        print(f"Intent router enabled (margin={INTENT_ROUTER_MARGIN}, out-of-domain threshold={INTENT_ROUTER_OOD_THRESHOLD}).")
+        return RoutedAgent(agent, router, rag_tool, OUT_OF_DOMAIN_ANSWER)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.documents import Document
+
+
+def normalize_query(query):
+    return " ".join(query.lower().split())
+
+
+def _json_value(value):
+    # Reranker scores in metadata are numpy scalars (e.g. FlashRank's relevance_score).
+    return value.item() if isinstance(value, np.generic) else str(value)
+
+
+class SemanticCache:
+    """Answer cache keyed on the query embedding.
+
+    A lookup embeds the query and returns the stored answer of the most similar cached
+    query when its cosine similarity reaches `threshold`. Entries are evicted least
+    recently used first once `max_size` is reached, and expire after `ttl_seconds`.
+    When `path` is set, entries are also written to a SQLite file so they survive
+    restarts and are shared between gunicorn workers.
+    """
+
+    def __init__(self, embedding_model, threshold=0.95, max_size=2000, ttl_seconds=7 * 24 * 3600, path=None):
+        self.embedding_model = embedding_model
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.path = path
+        self._entries = OrderedDict()
+        self._matrix = None
+        self._keys = []
+        self._lock = threading.Lock()
+        self._last_rowid = 0
+        self._db = None
+        self._pid = os.getpid()
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, timeout=5)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS semantic_cache ("
+                "key TEXT PRIMARY KEY, query TEXT, embedding BLOB, answer TEXT, "
+                "sources TEXT, created_at REAL)"
+            )
+            self._db.commit()
+            self._sync_from_disk()
+
+    def _database(self):
+        # Called under self._lock. SQLite connections must not cross a fork (gunicorn
+        # --preload), so a forked worker opens its own.
+        if self._pid != os.getpid():
+            self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            self._pid = os.getpid()
+        return self._db
+
+    def _embed(self, query):
+        vector = np.asarray(self.embedding_model.embed_query(query), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _is_expired(self, entry, now):
+        return self.ttl_seconds and now - entry["created_at"] > self.ttl_seconds
+
+    def _put(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        self._matrix = None
+
+    def _sync_from_disk(self):
+        # Picks up entries written by other workers since the last sync.
+        rows = self._database().execute(
+            "SELECT rowid, key, query, embedding, answer, sources, created_at FROM semantic_cache "
+            "WHERE rowid > ? ORDER BY rowid", (self._last_rowid,)
+        ).fetchall()
+        now = time.time()
+        for rowid, key, query, embedding, answer, sources, created_at in rows:
+            self._last_rowid = max(self._last_rowid, rowid)
+            entry = {
+                "query": query,
+                "vector": np.frombuffer(embedding, dtype=np.float32),
+                "answer": answer,
+                "sources": json.loads(sources),
+                "created_at": created_at,
+            }
+            if not self._is_expired(entry, now):
+                self._put(key, entry)
+
+    def _similarity_matrix(self):
+        if self._matrix is None:
+            self._keys = list(self._entries)
+            self._matrix = np.vstack([self._entries[key]["vector"] for key in self._keys]) if self._keys else None
+        return self._matrix
+
+    def lookup(self, query):
+        """Returns {"result", "source_documents", "similarity"} for a hit, otherwise None."""
+        vector = self._embed(query)
+        with self._lock:
+            hit = self._lookup_vector(vector)
+            if hit is None and self._db is not None:
+                self._sync_from_disk()
+                hit = self._lookup_vector(vector)
+            if hit is None:
+                return None
+            key, similarity = hit
+            entry = self._entries[key]
+            self._entries.move_to_end(key)
+        return {
+            "result": entry["answer"],
+            "source_documents": [Document(page_content=doc["page_content"], metadata=doc["metadata"]) for doc in entry["sources"]],
+            "similarity": similarity,
+        }
+
+    def _lookup_vector(self, vector):
+        matrix = self._similarity_matrix()
+        if matrix is None:
+            return None
+        scores = matrix @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        key = self._keys[best]
+        if self._is_expired(self._entries[key], time.time()):
+            del self._entries[key]
+            self._matrix = None
+            return None
+        return key, float(scores[best])
+
+    def store(self, query, answer, source_documents):
+        vector = self._embed(query)
+        key = hashlib.sha256(normalize_query(query).encode("utf-8")).hexdigest()
+        sources = [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in source_documents or []]
+        # Keep only JSON-safe values, so memory and disk entries match and the write cannot fail on them.
+        sources_json = json.dumps(sources, ensure_ascii=False, default=_json_value)
+        sources = json.loads(sources_json)
+        entry = {"query": query, "vector": vector, "answer": answer, "sources": sources, "created_at": time.time()}
+        with self._lock:
+            self._put(key, entry)
+            if self._db is None:
+                return
+            # The answer is already computed; a failed write only loses the shared copy.
+            try:
+                self._database().execute(
+                    "INSERT OR REPLACE INTO semantic_cache (key, query, embedding, answer, sources, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, query, vector.tobytes(), answer, sources_json, entry["created_at"]),
+                )
+                # Keep the backing file bounded as well.
+                if self.ttl_seconds:
+                    self._database().execute("DELETE FROM semantic_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+                self._database().execute(
+                    "DELETE FROM semantic_cache WHERE key NOT IN "
+                    "(SELECT key FROM semantic_cache ORDER BY created_at DESC LIMIT ?)", (self.max_size,)
+                )
+                self._database().commit()
+            except sqlite3.Error as e:
+                self._database().rollback()
+                print(f"Semantic cache write failed: {e}")
@@ -1,12 +1,25 @@
-from langchain_community.document_loaders import TextLoader,DirectoryLoader, PyMuPDFLoader , WebBaseLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_community.document_loaders import TextLoader, WebBaseLoader
+from langchain.text_splitter import Language, RecursiveCharacterTextSplitter
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
 import os
 from dotenv import load_dotenv, find_dotenv
 from langchain_core.documents import Document
-import fitz
 import json
+import hashlib
+import re
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from hybrid_search import BM25Index, BM25_INDEX_FILENAME
+from vector_index import INDEX_TYPES, index_filename, build_derived_indexes
+from chunk_store import ChunkStore, CHUNK_STORE_FILENAME
+from pdf_ingest import iter_pdf_documents
+import faiss
+import pickle
+import sqlite3
 
 
 load_dotenv(find_dotenv())
@@ -14,16 +27,125 @@ load_dotenv(find_dotenv())
 BOOKS_DATA_PATH = "data/Books/"
 SCRAPTED_DATA_PATH = "data/scraped_data_gfg/"
 
+DB_FAISS_PATH = "vectorstore/db_faiss"
+# The manifest records a content hash for every source file and the ids of the chunks
+# it produced, so re-runs only embed what actually changed.
+MANIFEST_PATH = os.path.join(DB_FAISS_PATH, "ingest_manifest.json")
+MANIFEST_VERSION = 1
+# Sparse BM25 index over the same chunk ids, kept in sync with the FAISS store.
+BM25_INDEX_PATH = os.path.join(DB_FAISS_PATH, BM25_INDEX_FILENAME)
+# Chunk text and metadata live in SQLite instead of LangChain's pickled index.pkl.
+CHUNK_STORE_PATH = os.path.join(DB_FAISS_PATH, CHUNK_STORE_FILENAME)
+FAISS_INDEX_PATH = os.path.join(DB_FAISS_PATH, "index.faiss")
+LEGACY_DOCSTORE_PATH = os.path.join(DB_FAISS_PATH, "index.pkl")
+# Bump a loader's version when its output changes so its sources are re-chunked
+# even though the files themselves did not change.
+LOADER_VERSIONS = {'.pdf': 3, '.json': 4}
+
+EMBEDDING_MODEL_NAME = "BAAI/bge-small-en"
+CHUNK_SIZE = 800
+CHUNK_OVERLAP = 150
+# Code blocks and Q&A pairs are kept as one chunk up to this size instead of being cut
+# at CHUNK_SIZE; longer ones are split on code/paragraph boundaries.
+BLOCK_MAX_CHARS = 2400
+WHOLE_RECORD_TYPES = ('code', 'qa')
+# Record "language" metadata -> the text splitter's Language; others are split as plain text.
+CODE_LANGUAGE_ALIASES = {'c++': 'cpp', 'python3': 'python', 'javascript': 'js', 'typescript': 'ts', 'c#': 'csharp'}
+
+# Chunks are embedded in fixed-size batches spread over a pool of CPU worker processes.
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", 64))
+EMBED_WORKERS = int(os.environ.get("EMBED_WORKERS", max(1, (os.cpu_count() or 1) // 2)))
+
+# Extra index types derived from the flat index after each build, e.g. "ivf_pq,hnsw".
+# Each one is written next to index.faiss and reported with its recall@k against flat.
+FAISS_BUILD_INDEX_TYPES = [t.strip() for t in os.environ.get("FAISS_BUILD_INDEX_TYPES", "").split(",") if t.strip()]
+
 
 def load_pdf_files(data):
-    loader = DirectoryLoader(data,glob='*.pdf',loader_cls=PyMuPDFLoader)
-    documents = loader.load()
+    documents = []
+
+    for filename in sorted(os.listdir(data)):
+        if filename.lower().endswith('.pdf'):
+            documents.extend(iter_pdf_documents(os.path.join(data,filename)))
 
     return documents
 
-pdf_documents = load_pdf_files(BOOKS_DATA_PATH)
-print("PDF Docs Loaded Successfully with Length : ",len(pdf_documents))
 
+def strip_numbering(title):
+    return re.sub(r'^\s*\d+\.\s*', '', title or '').strip()
+
+
+def iter_gfg_theory_records(topics, base_metadata):
+    # gfg_dsa_theory_structured.json: topic_name -> subtopics -> sub_subtopics (content + code_snippets).
+    for topic in topics:
+        topic_name = strip_numbering(topic.get('topic_name'))
+        for subtopic in topic.get('subtopics', []):
+            subtopic_title = (subtopic.get('subtopic_title') or '').strip()
+            url = subtopic.get('subtopic_url') or topic.get('main_article_link', '')
+            heading = f"Topic: {topic_name}\nSubtopic: {subtopic_title}"
+            metadata = dict(base_metadata, record_type='subtopic', topic=topic_name, subtopic=subtopic_title, url=url)
+
+            sections = subtopic.get('sub_subtopics', [])
+            if not sections:
+                yield Document(page_content=heading, metadata=metadata)
+                continue
+
+            for section in sections:
+                section_title = (section.get('sub_subtopic_title') or '').strip()
+                section_heading = f"{heading}\nSection: {section_title}"
+                content = (section.get('content') or '').strip()
+                # The heading goes into metadata; split_documents puts it on top of every chunk.
+                if content:
+                    yield Document(page_content=content,
+                                   metadata=dict(metadata, record_type='theory', section=section_title,
+                                                 heading=section_heading))
+                # One record per language keeps every snippet whole and lets retrieval filter on it.
+                for language, code in (section.get('code_snippets') or {}).items():
+                    if not code or not code.strip():
+                        continue
+                    yield Document(page_content=code.strip(),
+                                   metadata=dict(metadata, record_type='code', section=section_title, language=language.lower(),
+                                                 heading=f"{section_heading}\nLanguage: {language}"))
+
+
+def iter_leetcode_records(problems, base_metadata):
+    # leetcode_problems.json: a flat list of {title, link, difficulty}.
+    for problem in problems:
+        title = (problem.get('title') or '').strip()
+        difficulty = problem.get('difficulty', '')
+        url = problem.get('link', '')
+        number = re.match(r'^\s*(\d+)\.', title)
+        metadata = dict(base_metadata, record_type='problem', topic='LeetCode', title=strip_numbering(title), difficulty=difficulty, url=url)
+        if number:
+            metadata['problem_number'] = int(number.group(1))
+        yield Document(page_content=f"LeetCode {title}\nDifficulty: {difficulty}\nLink: {url}", metadata=metadata)
+
+
+def is_gfg_theory(data_content):
+    return isinstance(data_content, list) and bool(data_content) and all(
+        isinstance(item, dict) and 'topic_name' in item and 'subtopics' in item for item in data_content)
+
+
+def is_leetcode_problems(data_content):
+    return isinstance(data_content, list) and bool(data_content) and all(
+        isinstance(item, dict) and 'title' in item and 'link' in item for item in data_content)
+
+
+def load_json_file(filepath):
+    with open(filepath,'r',encoding='utf-8') as f:
+        data_content = json.load(f)
+
+    filename = os.path.basename(filepath)
+    metadata = {'source': filepath, 'file_type': 'json', 'filename': filename}
+
+    if is_gfg_theory(data_content):
+        return list(iter_gfg_theory_records(data_content, metadata))
+    if is_leetcode_problems(data_content):
+        return list(iter_leetcode_records(data_content, metadata))
+
+    # Unknown schema: fall back to indexing the raw JSON text.
+    page_content = json.dumps(data_content,ensure_ascii=False)
+    return [Document(page_content=page_content,metadata=metadata)]
 
 
 def load_scraped_data(data):
@@ -32,49 +154,417 @@ def load_scraped_data(data):
     for filename in os.listdir(data):
         if filename.lower().endswith('.json'):
             filepath = os.path.join(data,filename)
-            with open(filepath,'r',encoding='utf-8') as f:
-                data_content = json.load(f)
-            
-
-            page_content = json.dumps(data_content,ensure_ascii=False)
-            metadata = {'source': filepath, 'file_type': 'json', 'filename': filename}
+            documents.extend(load_json_file(filepath))
 
-            documents.append(Document(page_content=page_content,metadata=metadata))
-    
     return documents
 
-json_documents = load_scraped_data(SCRAPTED_DATA_PATH)
-print("JSON Docs Loaded Successfully with Length : ",len(json_documents))
-combined_documents = pdf_documents + json_documents
-print("Documents Loaded Successfully with Length : ",len(combined_documents))
 
-def create_chunks(extracted_data):
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=800,chunk_overlap=150)
-    text_chunks = text_splitter.split_documents(extracted_data)
+def discover_source_files():
+    sources = []
+    for data, extension in ((BOOKS_DATA_PATH, '.pdf'), (SCRAPTED_DATA_PATH, '.json')):
+        if not os.path.isdir(data):
+            continue
+        for filename in sorted(os.listdir(data)):
+            if filename.lower().endswith(extension):
+                sources.append(os.path.join(data,filename))
+    return sources
+
+
+def code_splitter(language):
+    language = CODE_LANGUAGE_ALIASES.get(language, language)
+    if language not in {member.value for member in Language}:
+        return None
+    return RecursiveCharacterTextSplitter.from_language(Language(language), chunk_size=BLOCK_MAX_CHARS, chunk_overlap=0)
+
+
+def split_documents(documents, text_splitter):
+    # Prose is cut at CHUNK_SIZE; code blocks and Q&A pairs stay whole up to BLOCK_MAX_CHARS.
+    # A record's "heading" metadata (topic/section, code language) is put on top of every
+    # chunk, so continuation chunks are self-contained too.
+    block_splitter = RecursiveCharacterTextSplitter(chunk_size=BLOCK_MAX_CHARS, chunk_overlap=0)
+    code_splitters = {}
+    for document in documents:
+        heading = document.metadata.get('heading')
+        if heading:
+            document = Document(page_content=document.page_content,
+                                metadata={key: value for key, value in document.metadata.items() if key != 'heading'})
+        record_type = document.metadata.get('record_type')
+        if record_type not in WHOLE_RECORD_TYPES:
+            chunks = text_splitter.split_documents([document])
+        elif len(document.page_content) <= BLOCK_MAX_CHARS:
+            chunks = [document]
+        elif record_type == 'code':
+            language = document.metadata.get('language', '')
+            if language not in code_splitters:
+                code_splitters[language] = code_splitter(language)
+            chunks = (code_splitters[language] or block_splitter).split_documents([document])
+        else:
+            chunks = block_splitter.split_documents([document])
+        for chunk in chunks:
+            if heading:
+                chunk.page_content = f"{heading}\n\n{chunk.page_content}"
+            yield chunk
+
+
+def create_chunks(extracted_data, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size,chunk_overlap=chunk_overlap)
+    text_chunks = list(split_documents(extracted_data, text_splitter))
 
     return text_chunks
 
-text_chunks = create_chunks(extracted_data=combined_documents)
-print("Combined Documents Converted Successfully into Chunks with Length : ",len(text_chunks))
 
 def get_embedding_model():
-    embedding_model = HuggingFaceEmbeddings(model_name = "BAAI/bge-small-en")
+    embedding_model = HuggingFaceEmbeddings(model_name = EMBEDDING_MODEL_NAME)
 
     return embedding_model
 
-embedding_model = get_embedding_model()
 
-DB_FAISS_PATH = "vectorstore/db_faiss"
+def loader_version(source):
+    return LOADER_VERSIONS[os.path.splitext(source)[1].lower()]
+
+
+def hash_file(filepath):
+    sha = hashlib.sha256()
+    with open(filepath,'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def assign_chunk_ids(chunks):
+    # A chunk id only depends on its source, its text and how many identical chunks
+    # came before it in that source, so unchanged text keeps its id (and its vector)
+    # even when pages are inserted or removed around it.
+    occurrences = {}
+    for chunk in chunks:
+        source = chunk.metadata.get('source', '')
+        content_hash = hashlib.sha256(chunk.page_content.encode('utf-8')).hexdigest()
+        occurrence = occurrences.get((source, content_hash), 0)
+        occurrences[(source, content_hash)] = occurrence + 1
+        yield hashlib.sha256(f"{source}\x00{content_hash}\x00{occurrence}".encode('utf-8')).hexdigest(), chunk
+
+
+def new_manifest():
+    return {
+        'version': MANIFEST_VERSION,
+        'embedding_model': EMBEDDING_MODEL_NAME,
+        'chunk_size': CHUNK_SIZE,
+        'chunk_overlap': CHUNK_OVERLAP,
+        'block_max_chars': BLOCK_MAX_CHARS,
+        'files': {},
+    }
+
+
+def load_manifest():
+    """Returns the stored manifest, or None when the index has to be rebuilt from scratch."""
+    if not (os.path.exists(MANIFEST_PATH) and os.path.exists(FAISS_INDEX_PATH)):
+        return None
+    with open(MANIFEST_PATH,'r',encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    expected = new_manifest()
+    # Older manifests predate whole code/Q&A chunks; their loader versions are stale, so
+    # every source is re-chunked anyway.
+    manifest.setdefault('block_max_chars', BLOCK_MAX_CHARS)
+    for key in ('version', 'embedding_model', 'chunk_size', 'chunk_overlap', 'block_max_chars'):
+        if manifest.get(key) != expected[key]:
+            print(f"Manifest setting '{key}' changed ({manifest.get(key)} -> {expected[key]}), rebuilding the whole index.")
+            return None
+    return manifest
+
+
+def save_manifest(manifest):
+    os.makedirs(DB_FAISS_PATH, exist_ok=True)
+    tmp_path = MANIFEST_PATH + ".tmp"
+    with open(tmp_path,'w',encoding='utf-8') as f:
+        json.dump(manifest,f,indent=1)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def iter_source_documents(source):
+    if source.lower().endswith('.pdf'):
+        yield from iter_pdf_documents(source)
+    else:
+        yield from load_json_file(source)
+
+
+def iter_source_chunks(source, text_splitter):
+    # Pages are split as they are parsed, so a large book is never held in memory at once.
+    yield from split_documents(iter_source_documents(source), text_splitter)
+
+
+def iter_batches(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+_worker_embedding_model = None
+
+
+def _init_embedding_worker(torch_threads):
+    global _worker_embedding_model
+    import torch
+    torch.set_num_threads(torch_threads)
+    _worker_embedding_model = get_embedding_model()
+
+
+def _embed_texts(texts):
+    return np.asarray(_worker_embedding_model.embed_documents(texts), dtype=np.float32)
+
+
+def embed_batches(batches, embedding_model):
+    """Yields (batch, vectors) in submission order.
+
+    With more than one worker the batches are spread over a process pool and at most
+    two batches per worker are in flight, which keeps memory bounded while every
+    core stays busy.
+    """
+    if EMBED_WORKERS <= 1:
+        for batch in batches:
+            yield batch, embedding_model.embed_documents([chunk.page_content for _, chunk in batch])
+        return
+
+    torch_threads = max(1, (os.cpu_count() or 1) // EMBED_WORKERS)
+    print(f"Embedding with {EMBED_WORKERS} worker processes ({torch_threads} torch threads each), batch size {EMBED_BATCH_SIZE}.")
+    with ProcessPoolExecutor(max_workers=EMBED_WORKERS,
+                             mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_embedding_worker,
+                             initargs=(torch_threads,)) as pool:
+        in_flight = deque()
+        for batch in batches:
+            in_flight.append((batch, pool.submit(_embed_texts, [chunk.page_content for _, chunk in batch])))
+            if len(in_flight) >= EMBED_WORKERS * 2:
+                done_batch, future = in_flight.popleft()
+                yield done_batch, future.result()
+        while in_flight:
+            done_batch, future = in_flight.popleft()
+            yield done_batch, future.result()
+
+
+def load_vectorstore(embedding_model, chunk_store):
+    index_to_docstore_id = chunk_store.load_positions()
+    if not index_to_docstore_id and os.path.exists(LEGACY_DOCSTORE_PATH):
+        # One-off migration of a store written by FAISS.save_local; no re-embedding needed.
+        print(f"Migrating {LEGACY_DOCSTORE_PATH} into {CHUNK_STORE_PATH}.")
+        with open(LEGACY_DOCSTORE_PATH, 'rb') as f:
+            legacy_docstore, index_to_docstore_id = pickle.load(f)
+        chunk_store.add({chunk_id: legacy_docstore.search(chunk_id) for chunk_id in index_to_docstore_id.values()})
+    index = faiss.read_index(FAISS_INDEX_PATH)
+    return FAISS(embedding_model, index, chunk_store, index_to_docstore_id)
+
+
+def vectorstore_is_consistent():
+    """True when the chunk store's positions cover exactly the rows of index.faiss.
+
+    Appending to a mismatched pair (e.g. chunks.sqlite deleted, manifest kept) would map
+    new chunk ids to the wrong FAISS rows, so such a store is rebuilt instead.
+    """
+    positions = {}
+    if os.path.exists(CHUNK_STORE_PATH):
+        try:
+            positions = ChunkStore(CHUNK_STORE_PATH, read_only=True).load_positions()
+        except sqlite3.Error:
+            positions = {}
+    if not positions and os.path.exists(LEGACY_DOCSTORE_PATH):
+        # load_vectorstore migrates these positions into the chunk store.
+        with open(LEGACY_DOCSTORE_PATH, 'rb') as f:
+            _, positions = pickle.load(f)
+    ntotal = faiss.read_index(FAISS_INDEX_PATH).ntotal
+    return set(positions) == set(range(ntotal))
+
+
+def migrate_legacy_store():
+    """Turns a FAISS.save_local store (index.faiss + index.pkl, no manifest) into a chunk
+    store plus a manifest, so update_vectorstore can continue incrementally.
+
+    Legacy chunks are re-keyed with the ids assign_chunk_ids gives them, and every source
+    gets a stale loader version. Each source is then re-chunked, and chunks whose text is
+    unchanged keep their vectors instead of being embedded again.
+    """
+    print(f"Migrating {LEGACY_DOCSTORE_PATH} (no manifest) into {CHUNK_STORE_PATH}.")
+    if os.path.exists(CHUNK_STORE_PATH):
+        os.remove(CHUNK_STORE_PATH)
+    with open(LEGACY_DOCSTORE_PATH, 'rb') as f:
+        legacy_docstore, legacy_positions = pickle.load(f)
+    positions = sorted(legacy_positions)
+    documents = [legacy_docstore.search(legacy_positions[position]) for position in positions]
+
+    chunk_store = ChunkStore(CHUNK_STORE_PATH)
+    index_to_docstore_id = {}
+    manifest = new_manifest()
+    for position, (chunk_id, document) in zip(positions, assign_chunk_ids(documents)):
+        index_to_docstore_id[position] = chunk_id
+        chunk_store.add({chunk_id: Document(id=chunk_id, page_content=document.page_content, metadata=document.metadata)})
+        source = document.metadata.get('source', '')
+        entry = manifest['files'].setdefault(source, {'sha256': '', 'loader': 0, 'chunks': []})
+        entry['chunks'].append(chunk_id)
+    chunk_store.write_positions(index_to_docstore_id)
+    chunk_store.commit()
+    print(f"Migrated {len(positions)} chunks from {len(manifest['files'])} sources.")
+    return manifest
+
+
+def save_vectorstore(db, chunk_store):
+    # The index goes to a temp file first so index.faiss and the committed positions
+    # table are swapped in together.
+    # Derived indexes address chunks by row position, which deletions shift even when the
+    # vector count stays the same, so they are removed before the flat index changes and
+    # rebuilt from it (FAISS_BUILD_INDEX_TYPES). The backend falls back to flat meanwhile.
+    for index_type in INDEX_TYPES:
+        derived_path = os.path.join(DB_FAISS_PATH, index_filename(index_type))
+        if index_type != "flat" and os.path.exists(derived_path):
+            os.remove(derived_path)
+    tmp_path = FAISS_INDEX_PATH + ".tmp"
+    faiss.write_index(db.index, tmp_path)
+    chunk_store.write_positions(db.index_to_docstore_id)
+    chunk_store.commit()
+    os.replace(tmp_path, FAISS_INDEX_PATH)
+    if os.path.exists(LEGACY_DOCSTORE_PATH):
+        os.remove(LEGACY_DOCSTORE_PATH)
+
+
+def update_vectorstore():
+    unknown_types = [t for t in FAISS_BUILD_INDEX_TYPES if t not in INDEX_TYPES]
+    if unknown_types:
+        raise ValueError(f"Unknown FAISS_BUILD_INDEX_TYPES {unknown_types}, expected any of: {', '.join(INDEX_TYPES)}.")
+
+    manifest = load_manifest()
+    if manifest is not None and manifest['files'] and not vectorstore_is_consistent():
+        print(f"{CHUNK_STORE_PATH} is missing or does not match {FAISS_INDEX_PATH}, "
+              "discarding the stored index.")
+        manifest = None
+        for path in [os.path.join(DB_FAISS_PATH, index_filename(t)) for t in INDEX_TYPES] + [BM25_INDEX_PATH]:
+            if os.path.exists(path):
+                os.remove(path)
+    if manifest is None and not os.path.exists(MANIFEST_PATH) and os.path.exists(LEGACY_DOCSTORE_PATH) \
+            and os.path.exists(FAISS_INDEX_PATH):
+        manifest = migrate_legacy_store()
+    if manifest is None:
+        print("No usable ingestion manifest found, building the FAISS vector store from scratch.")
+        manifest = new_manifest()
+        if os.path.exists(CHUNK_STORE_PATH):
+            os.remove(CHUNK_STORE_PATH)
+    previous_files = manifest['files']
+
+    # Cheap first pass: only hash the files, nothing is parsed or embedded yet.
+    sources = discover_source_files()
+    stale_ids = []
+    for source in previous_files:
+        if source not in sources:
+            print(f"Source removed: {source} ({len(previous_files[source]['chunks'])} chunks)")
+            stale_ids.extend(previous_files[source]['chunks'])
+
+    files = {}
+    changed_sources = []
+    for source in sources:
+        file_hash = hash_file(source)
+        previous = previous_files.get(source)
+        if previous and previous['sha256'] == file_hash and previous.get('loader', 1) == loader_version(source):
+            files[source] = previous
+        else:
+            changed_sources.append((source, file_hash))
+
+    bm25_missing = bool(previous_files) and not os.path.exists(BM25_INDEX_PATH)
+    if not changed_sources and not stale_ids and not bm25_missing:
+        print("Vector store is already up to date, nothing to embed.")
+        missing_types = [t for t in FAISS_BUILD_INDEX_TYPES
+                         if not os.path.exists(os.path.join(DB_FAISS_PATH, index_filename(t)))]
+        if previous_files and missing_types:
+            build_derived_indexes(faiss.read_index(FAISS_INDEX_PATH), DB_FAISS_PATH, missing_types)
+        return
+
+    embedding_model = get_embedding_model()
+    chunk_store = ChunkStore(CHUNK_STORE_PATH)
+    db = None
+    if previous_files:
+        db = load_vectorstore(embedding_model, chunk_store)
+    existing_ids = set(db.index_to_docstore_id.values()) if db is not None else set()
+
+    bm25_index = BM25Index()
+    if db is not None:
+        if bm25_missing:
+            print("No BM25 index found next to the FAISS store, building it from the stored chunks.")
+            for chunk_id in existing_ids:
+                bm25_index.add(chunk_id, db.docstore.search(chunk_id).page_content)
+        else:
+            bm25_index = BM25Index.load(BM25_INDEX_PATH)
+
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE,chunk_overlap=CHUNK_OVERLAP)
+
+    def pending_chunks():
+        for source, file_hash in changed_sources:
+            previous = previous_files.get(source)
+            old_ids = set(previous['chunks']) if previous else set()
+            chunk_ids = []
+            to_embed = 0
+            for chunk_id, chunk in assign_chunk_ids(iter_source_chunks(source, text_splitter)):
+                chunk_ids.append(chunk_id)
+                if chunk_id in existing_ids:
+                    # Same text as before: keep the vector, only refresh metadata such as page numbers.
+                    db.docstore.add({chunk_id: Document(id=chunk_id, page_content=chunk.page_content, metadata=chunk.metadata)})
+                else:
+                    to_embed += 1
+                    yield chunk_id, chunk
+            current_ids = set(chunk_ids)
+            removed = [chunk_id for chunk_id in old_ids if chunk_id not in current_ids]
+            stale_ids.extend(removed)
+            status = "changed" if previous else "new"
+            print(f"Source {status}: {source} ({len(chunk_ids)} chunks, {to_embed} embedded, {len(removed)} to remove)")
+            files[source] = {'sha256': file_hash, 'loader': loader_version(source), 'chunks': chunk_ids}
+
+    embedded = 0
+    start_time = time.perf_counter()
+    for batch, vectors in embed_batches(iter_batches(pending_chunks(), EMBED_BATCH_SIZE), embedding_model):
+        text_embeddings = [(chunk.page_content, vector) for (_, chunk), vector in zip(batch, vectors)]
+        metadatas = [chunk.metadata for _, chunk in batch]
+        ids = [chunk_id for chunk_id, _ in batch]
+        if db is None:
+            db = FAISS.from_embeddings(text_embeddings, embedding_model, metadatas=metadatas, ids=ids,
+                                       docstore=chunk_store, index_to_docstore_id={})
+        else:
+            db.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+        for chunk_id, chunk in batch:
+            bm25_index.add(chunk_id, chunk.page_content)
+        embedded += len(batch)
+        elapsed = time.perf_counter() - start_time
+        print(f"Embedded {embedded} chunks ({embedded / elapsed:.1f} chunks/s)")
+
+    if embedded:
+        elapsed = time.perf_counter() - start_time
+        print(f"\nEmbedded {embedded} new or changed chunks in {elapsed:.1f}s ({embedded / elapsed:.1f} chunks/s).")
+
+    if db is not None:
+        # Only touch ids the store really holds, so an interrupted previous run
+        # (index saved, manifest not) heals itself instead of failing.
+        stale_ids = [chunk_id for chunk_id in set(stale_ids) if chunk_id in existing_ids]
+        if stale_ids:
+            print(f"Removing {len(stale_ids)} stale vectors.")
+            db.delete(stale_ids)
+            for chunk_id in stale_ids:
+                bm25_index.remove(chunk_id)
+
+    if db is None:
+        print("No documents found to index.")
+        return
 
+    print(f"\nSaving FAISS vector store locally to: {DB_FAISS_PATH}")
+    save_vectorstore(db, chunk_store)
+    bm25_index.save(BM25_INDEX_PATH)
+    manifest['files'] = {source: files[source] for source in sources}
+    save_manifest(manifest)
+    print(f"Saved Successfully! The store now holds {db.index.ntotal} vectors.")
 
-print(f"\nStarting to create FAISS vector store from {len(text_chunks)} chunks.")
-print("This step involves generating embeddings for all chunks and can take a long time...")
-db = FAISS.from_documents(text_chunks,embedding_model)
-print("FAISS vector store created successfully!")
+    if FAISS_BUILD_INDEX_TYPES:
+        print(f"\nBuilding derived FAISS indexes: {', '.join(FAISS_BUILD_INDEX_TYPES)}")
+        build_derived_indexes(db.index, DB_FAISS_PATH, FAISS_BUILD_INDEX_TYPES)
 
-# --- Step 3: Save the FAISS vector store ---
-print(f"\nSaving FAISS vector store locally to: {DB_FAISS_PATH}")
-db.save_local(DB_FAISS_PATH)
-print("Saved Successfully!")
 
-print("\n--- Data Preparation Process Complete ---")
\ No newline at end of file
+if __name__ == "__main__":
+    update_vectorstore()
+    print("\n--- Data Preparation Process Complete ---")
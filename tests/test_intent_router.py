@@ -0,0 +1,92 @@
+import queue
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import LLM
+from langchain_core.retrievers import BaseRetriever
+
+import rag_query
+from intent_router import KNOWLEDGE
+from rag_query import AgentEventCallbackHandler, get_dsa_agent
+
+ANSWER = "A stack is a last-in, first-out collection."
+
+
+class FakeLLM(LLM):
+    """Streams its answer word by word when `streaming` is set, like PooledTogether."""
+
+    streaming: bool = False
+
+    @property
+    def _llm_type(self):
+        return "fake"
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        if self.streaming and run_manager is not None:
+            words = ANSWER.split(" ")
+            for position, word in enumerate(words):
+                run_manager.on_llm_new_token(word if position == len(words) - 1 else word + " ")
+        return ANSWER
+
+
+class FakeEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        return [[1.0, float(len(text))] for text in texts]
+
+    def embed_query(self, text):
+        return [1.0, float(len(text))]
+
+
+class FakeRetriever(BaseRetriever):
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        return [Document(page_content="A stack is LIFO.", metadata={"source": "stack.pdf"})]
+
+
+class FakeStore:
+    embeddings = FakeEmbeddings()
+
+
+class FakeSandboxPool:
+    idle = queue.Queue()
+
+
+class KnowledgeRouter:
+    def route(self, query, chat_history=None):
+        return KNOWLEDGE
+
+
+def build_routed_agent(monkeypatch):
+    monkeypatch.setattr(rag_query, "INTENT_ROUTER_ENABLED", True)
+    monkeypatch.setattr(rag_query, "SEMANTIC_CACHE_ENABLED", False)
+    monkeypatch.setattr(rag_query, "SPECULATIVE_RETRIEVAL", False)
+    monkeypatch.setattr(rag_query, "load_llm", lambda model, temperature=0.0, streaming=False: FakeLLM(streaming=streaming))
+    monkeypatch.setattr(rag_query, "get_retriever", lambda db_instance: FakeRetriever())
+    monkeypatch.setattr(rag_query, "get_sandbox_pool", FakeSandboxPool)
+    monkeypatch.setattr(rag_query, "initialize_parallel_agent", lambda **kwargs: None)
+    agent = get_dsa_agent(FakeStore())
+    agent.router = KnowledgeRouter()
+    return agent
+
+
+def test_routed_knowledge_query_streams_tokens(monkeypatch):
+    agent = build_routed_agent(monkeypatch)
+    events = []
+    handler = AgentEventCallbackHandler(lambda event, data: events.append((event, data)))
+
+    result = agent.invoke({"input": "What is a stack?", "chat_history": []}, config={"callbacks": [handler]})
+
+    assert result["route"] == KNOWLEDGE
+    assert result["output"] == ANSWER
+    tokens = [data["text"] for event, data in events if event == "token"]
+    assert len(tokens) > 1
+    assert "".join(tokens) == ANSWER
+
+
+def test_knowledge_tool_inside_agent_does_not_stream(monkeypatch):
+    # Called by the agent, the tool's answer is an observation, not the final answer.
+    agent = build_routed_agent(monkeypatch)
+    events = []
+    handler = AgentEventCallbackHandler(lambda event, data: events.append((event, data)))
+
+    assert agent.knowledge_tool.invoke("What is a stack?", config={"callbacks": [handler]}) == ANSWER
+    assert not [data for event, data in events if event == "token"]
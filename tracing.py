@@ -0,0 +1,380 @@
+import atexit
+import contextvars
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.documents.compressor import BaseDocumentCompressor
+from langchain_core.embeddings import Embeddings
+
+# One line per request with every span ("summary"), the full trace as JSON ("json"), or
+# nothing ("off"). Histograms on /metrics are kept either way.
+TRACE_LOG = os.environ.get("TRACE_LOG", "summary").lower()
+
+# Seconds; the same buckets for every stage, from a FAISS lookup to a long agent run.
+HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# SQLite file the metrics of every process are summed into, so /metrics reports the same
+# totals whichever gunicorn worker answers (gunicorn.conf.py sets a fresh one per
+# master). Each process adds its new observations every METRICS_FLUSH_SECONDS and
+# before rendering. Unset, metrics stay in this process.
+METRICS_PATH = os.environ.get("METRICS_PATH") or None
+METRICS_FLUSH_SECONDS = float(os.environ.get("METRICS_FLUSH_SECONDS", 5))
+
+_metrics_lock = threading.Lock()
+# (stage, name) -> [bucket counts..., count, sum]; with METRICS_PATH, only what is not flushed yet.
+_histograms = {}
+# (metric, labels tuple) -> value; likewise.
+_counters = {}
+_metrics_db = None
+_metrics_pid = None
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+# ---- Metrics --------------------------------------------------------------------------------
+
+def _shared_metrics():
+    """Called under _metrics_lock. Opens the shared store for this process, or returns None."""
+    global _metrics_db, _metrics_pid
+    if METRICS_PATH is None:
+        return None
+    if _metrics_pid != os.getpid():
+        # First use in this process, or a forked worker: the parent flushes what it had
+        # recorded, so the inherited deltas are dropped rather than counted twice.
+        _histograms.clear()
+        _counters.clear()
+        os.makedirs(os.path.dirname(METRICS_PATH) or ".", exist_ok=True)
+        _metrics_db = sqlite3.connect(METRICS_PATH, check_same_thread=False, timeout=5)
+        _metrics_db.execute("PRAGMA journal_mode=WAL")
+        _metrics_db.execute("CREATE TABLE IF NOT EXISTS histograms ("
+                            "stage TEXT, name TEXT, bucket TEXT, value REAL, PRIMARY KEY (stage, name, bucket))")
+        _metrics_db.execute("CREATE TABLE IF NOT EXISTS counters ("
+                            "metric TEXT, labels TEXT, value REAL, PRIMARY KEY (metric, labels))")
+        _metrics_db.commit()
+        _metrics_pid = os.getpid()
+        threading.Thread(target=_flush_periodically, daemon=True, name="metrics-flush").start()
+    return _metrics_db
+
+
+def _flush_metrics():
+    """Called under _metrics_lock. Adds this process's unflushed metrics to the shared store."""
+    db = _shared_metrics()
+    if db is None or not (_histograms or _counters):
+        return
+    # Buckets are keyed by their bound, so totals stay readable if HISTOGRAM_BUCKETS changes.
+    bucket_keys = [str(bound) for bound in HISTOGRAM_BUCKETS] + ["count", "sum"]
+    try:
+        db.executemany(
+            "INSERT INTO histograms (stage, name, bucket, value) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (stage, name, bucket) DO UPDATE SET value = value + excluded.value",
+            [(stage, name, bucket, value) for (stage, name), values in _histograms.items()
+             for bucket, value in zip(bucket_keys, values)])
+        db.executemany(
+            "INSERT INTO counters (metric, labels, value) VALUES (?, ?, ?) "
+            "ON CONFLICT (metric, labels) DO UPDATE SET value = value + excluded.value",
+            [(metric, json.dumps(labels, default=str), value) for (metric, labels), value in _counters.items()])
+        db.commit()
+    except sqlite3.Error as e:
+        db.rollback()
+        print(f"Could not write metrics to {METRICS_PATH}: {e}")
+        return
+    _histograms.clear()
+    _counters.clear()
+
+
+def _flush_periodically():
+    pid = os.getpid()
+    while _metrics_pid == pid:
+        time.sleep(METRICS_FLUSH_SECONDS)
+        with _metrics_lock:
+            _flush_metrics()
+
+
+@atexit.register
+def _flush_at_exit():
+    with _metrics_lock:
+        if _metrics_pid == os.getpid():
+            _flush_metrics()
+
+
+def _read_shared_metrics(db):
+    histograms = {}
+    bucket_index = {str(bound): i for i, bound in enumerate(HISTOGRAM_BUCKETS)}
+    bucket_index.update(count=len(HISTOGRAM_BUCKETS), sum=len(HISTOGRAM_BUCKETS) + 1)
+    for stage, name, bucket, value in db.execute("SELECT stage, name, bucket, value FROM histograms"):
+        if bucket in bucket_index:
+            values = histograms.setdefault((stage, name), [0] * len(HISTOGRAM_BUCKETS) + [0, 0.0])
+            values[bucket_index[bucket]] = value if bucket == "sum" else int(value)
+    counters = {}
+    for metric, labels, value in db.execute("SELECT metric, labels, value FROM counters"):
+        counters[(metric, tuple(tuple(pair) for pair in json.loads(labels)))] = int(value) if value == int(value) else value
+    return histograms, counters
+
+
+def observe(stage, seconds, name=""):
+    with _metrics_lock:
+        _shared_metrics()
+        histogram = _histograms.get((stage, name))
+        if histogram is None:
+            histogram = _histograms[(stage, name)] = [0] * len(HISTOGRAM_BUCKETS) + [0, 0.0]
+        for i, bound in enumerate(HISTOGRAM_BUCKETS):
+            if seconds <= bound:
+                histogram[i] += 1
+        histogram[-2] += 1
+        histogram[-1] += seconds
+
+
+def increment(metric, value=1, **labels):
+    key = (metric, tuple(sorted(labels.items())))
+    with _metrics_lock:
+        _shared_metrics()
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def _label_text(labels):
+    escaped = ((key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for key, value in labels)
+    return ",".join(f'{key}="{value}"' for key, value in escaped)
+
+
+def render_metrics():
+    """Prometheus text exposition of the histograms and counters (of all processes with METRICS_PATH)."""
+    with _metrics_lock:
+        db = _shared_metrics()
+        if db is not None:
+            _flush_metrics()
+            histograms, counters = _read_shared_metrics(db)
+        else:
+            histograms = {key: list(values) for key, values in _histograms.items()}
+            counters = dict(_counters)
+
+    lines = [
+        "# HELP dsa_stage_duration_seconds Time spent per request stage.",
+        "# TYPE dsa_stage_duration_seconds histogram",
+    ]
+    for (stage, name), values in sorted(histograms.items()):
+        labels = _label_text((("stage", stage), ("name", name)))
+        for bound, count in zip(HISTOGRAM_BUCKETS, values):
+            lines.append(f'dsa_stage_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f'dsa_stage_duration_seconds_bucket{{{labels},le="+Inf"}} {values[-2]}')
+        lines.append(f"dsa_stage_duration_seconds_count{{{labels}}} {values[-2]}")
+        lines.append(f"dsa_stage_duration_seconds_sum{{{labels}}} {values[-1]:.6f}")
+
+    for metric in sorted({metric for metric, _ in counters}):
+        lines.append(f"# TYPE {metric} counter")
+        for (name, labels), value in sorted(counters.items()):
+            if name == metric:
+                lines.append(f"{metric}{{{_label_text(labels)}}} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# ---- Traces and spans -----------------------------------------------------------------------
+
+class Trace:
+    """The spans recorded for one request, possibly from several threads."""
+
+    def __init__(self, name, attributes=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.attributes = attributes or {}
+        self.start = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def summary(self, seconds):
+        parts = []
+        for span in sorted(self.spans, key=lambda span: span["offset"]):
+            label = span["stage"] + (f"[{span['name']}]" if span["name"] else "")
+            details = " ".join(f"{key}={value}" for key, value in span.items()
+                               if key not in ("stage", "name", "seconds", "offset"))
+            parts.append(f"{label} {span['seconds']:.3f}s" + (f" ({details})" if details else ""))
+        header = " ".join([f"Trace {self.id} {self.name} {seconds:.3f}s"] +
+                          [f"{key}={value}" for key, value in self.attributes.items()])
+        return header + " | " + " | ".join(parts)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def record_span(stage, seconds, name="", trace=None, start=None, **attributes):
+    """Adds a finished span to the histograms and to the request's trace, if any."""
+    observe(stage, seconds, name)
+    trace = trace or _current_trace.get()
+    if trace is not None:
+        offset = (start if start is not None else time.perf_counter() - seconds) - trace.start
+        trace.add({"stage": stage, "name": name, "seconds": round(seconds, 4), "offset": round(offset, 4), **attributes})
+
+
+@contextmanager
+def span(stage, name="", **attributes):
+    """Times the block as one span. Yields a dict; keys set on it become span attributes."""
+    start = time.perf_counter()
+    try:
+        yield attributes
+    except Exception as e:
+        attributes["error"] = type(e).__name__
+        raise
+    finally:
+        record_span(stage, time.perf_counter() - start, name, start=start, **attributes)
+
+
+@contextmanager
+def trace_request(name, **attributes):
+    """Collects the spans of one request and logs them once it finishes (TRACE_LOG)."""
+    trace = Trace(name, attributes)
+    token = _current_trace.set(trace)
+    status = "ok"
+    try:
+        yield trace
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        _current_trace.reset(token)
+        seconds = time.perf_counter() - trace.start
+        observe("request", seconds, name)
+        increment("dsa_requests_total", endpoint=name, status=status)
+        if TRACE_LOG == "json":
+            print(json.dumps({"trace": trace.id, "name": name, "seconds": round(seconds, 4), "status": status,
+                              **trace.attributes, "spans": sorted(trace.spans, key=lambda span: span["offset"])}, default=str))
+        elif TRACE_LOG != "off":
+            print(trace.summary(seconds))
+
+
+@contextmanager
+def collect_spans(name, **attributes):
+    """Like trace_request, but only collects the spans: nothing is logged or counted as a request."""
+    trace = Trace(name, attributes)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def record_cache(cache, hit, **attributes):
+    result = "hit" if hit else "miss"
+    increment("dsa_cache_requests_total", cache=cache, result=result)
+    return {"cache": cache, "result": result, **attributes}
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """Turns LangChain run events into spans: one per LLM call, tool call and retrieval.
+
+    LLM spans are named after the tool they ran in ("Knowledge Base", "Code Generator",
+    ...) or "planning" for the agent's own calls, and carry token counts when the API
+    reports them plus the time to the first streamed token.
+    """
+
+    def __init__(self, trace=None):
+        self.trace = trace or current_trace()
+        self._runs = {}
+
+    def _start(self, run_id, parent_run_id, stage, name):
+        self._runs[run_id] = {"stage": stage, "name": name, "parent": parent_run_id, "start": time.perf_counter()}
+
+    def _end(self, run_id, **attributes):
+        run = self._runs.pop(run_id, None)
+        if run is None or run["stage"] == "chain":
+            return
+        first_token = run.get("first_token")
+        if first_token is not None:
+            attributes["first_token_s"] = round(first_token - run["start"], 3)
+        record_span(run["stage"], time.perf_counter() - run["start"], run["name"], trace=self.trace,
+                    start=run["start"], **attributes)
+
+    def _enclosing_tool(self, run_id):
+        run = self._runs.get(run_id)
+        while run is not None:
+            if run["stage"] == "tool":
+                return run["name"]
+            run = self._runs.get(run["parent"])
+        return None
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs):
+        # Chains are not timed; they only link LLM calls to the tool they run in.
+        self._start(run_id, parent_run_id, "chain", kwargs.get("name") or "")
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        self._start(run_id, parent_run_id, "llm", self._enclosing_tool(parent_run_id) or "planning")
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        run = self._runs.get(run_id)
+        if run is not None and "first_token" not in run:
+            run["first_token"] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        attributes = {}
+        if usage:
+            attributes = {"prompt_tokens": usage.get("prompt_tokens", 0), "completion_tokens": usage.get("completion_tokens", 0)}
+            run = self._runs.get(run_id)
+            name = run["name"] if run else ""
+            increment("dsa_llm_tokens_total", attributes["prompt_tokens"], name=name, type="prompt")
+            increment("dsa_llm_tokens_total", attributes["completion_tokens"], name=name, type="completion")
+        self._end(run_id, **attributes)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=type(error).__name__)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        self._start(run_id, parent_run_id, "tool", (serialized or {}).get("name") or kwargs.get("name") or "")
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=type(error).__name__)
+
+    def on_retriever_start(self, serialized, query, *, run_id, parent_run_id=None, **kwargs):
+        self._start(run_id, parent_run_id, "retrieve", kwargs.get("name") or "")
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._end(run_id, documents=len(documents))
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=type(error).__name__)
+
+
+class TracedEmbeddings(Embeddings):
+    """Embedding model wrapper that records an "embed" span per call."""
+
+    def __init__(self, embedding_model):
+        self.embedding_model = embedding_model
+
+    def embed_query(self, text):
+        with span("embed", "query"):
+            return self.embedding_model.embed_query(text)
+
+    def embed_documents(self, texts):
+        with span("embed", "documents", texts=len(texts)):
+            return self.embedding_model.embed_documents(texts)
+
+    def __getattr__(self, name):
+        return getattr(self.embedding_model, name)
+
+
+class TracedCompressor(BaseDocumentCompressor):
+    """Document compressor (reranker) wrapper that records a "rerank" span per call."""
+
+    compressor: BaseDocumentCompressor
+
+    def compress_documents(self, documents, query, callbacks=None):
+        with span("rerank", type(self.compressor).__name__, candidates=len(documents)):
+            return self.compressor.compress_documents(documents, query, callbacks=callbacks)
@@ -0,0 +1,107 @@
+import math
+import os
+import time
+
+import faiss
+import numpy as np
+
+# The flat index is always built: it is exact and supports in-place updates. The other
+# types are derived from its vectors after each build and trade recall for memory/speed.
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw", "sq8")
+
+
+def index_filename(index_type):
+    return "index.faiss" if index_type == "flat" else f"index_{index_type}.faiss"
+
+
+def index_factory_string(index_type, n_vectors, dimension):
+    # Keep ~39+ training points per IVF list, as faiss recommends.
+    nlist = max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // 39))
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "ivf_flat":
+        return f"IVF{nlist},Flat"
+    if index_type == "ivf_pq":
+        # 8 dimensions per sub-quantizer: 384-d bge-small vectors become 48-byte codes.
+        sub_quantizers = max(1, dimension // 8)
+        while dimension % sub_quantizers:
+            sub_quantizers -= 1
+        return f"IVF{nlist},PQ{sub_quantizers}x8"
+    if index_type == "hnsw":
+        return "HNSW32"
+    if index_type == "sq8":
+        return "SQ8"
+    raise ValueError(f"Unknown index type '{index_type}', expected one of: {', '.join(INDEX_TYPES)}.")
+
+
+def build_index(vectors, index_type):
+    index = faiss.index_factory(vectors.shape[1], index_factory_string(index_type, len(vectors), vectors.shape[1]))
+    if index_type == "hnsw":
+        index.hnsw.efConstruction = 80
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def configure_search(index, nprobe=16, ef_search=64):
+    """Applies query-time parameters for the IVF and HNSW index families."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = nprobe
+    if hasattr(index, "hnsw"):
+        index.hnsw.efSearch = ef_search
+    return index
+
+
+def read_index_mmap(path, index_type="flat"):
+    # Memory-mapped, read-only: every gunicorn worker maps the same file, so the vectors
+    # live once in the page cache instead of once per worker heap. IVF inverted lists
+    # are mapped with IO_FLAG_MMAP; flat-code storage (flat, SQ, HNSW) needs IO_FLAG_MMAP_IFC.
+    if index_type.startswith("ivf"):
+        flags = faiss.IO_FLAG_MMAP
+    else:
+        flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+    return faiss.read_index(path, flags | faiss.IO_FLAG_READ_ONLY)
+
+
+def recall_at_k(reference_index, candidate_index, queries, k=10):
+    """Recall@k of `candidate_index` against the exact neighbours from `reference_index`.
+
+    Returns (recall, milliseconds per query for the candidate index).
+    """
+    _, expected = reference_index.search(queries, k)
+    start = time.perf_counter()
+    _, found = candidate_index.search(queries, k)
+    elapsed_ms = (time.perf_counter() - start) * 1000 / max(1, len(queries))
+    hits = sum(len(set(e[e >= 0]) & set(f[f >= 0])) for e, f in zip(expected, found))
+    return hits / float(len(queries) * k), elapsed_ms
+
+
+def build_derived_indexes(flat_index, folder_path, index_types, k=10, n_queries=500, nprobe=16, ef_search=64):
+    """Builds each non-flat index type from the flat index's vectors and reports recall@k."""
+    vectors = flat_index.reconstruct_n(0, flat_index.ntotal)
+    rng = np.random.default_rng(0)
+    query_ids = rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False)
+    # Perturb the sampled vectors so queries are not exact copies of stored points.
+    queries = vectors[query_ids] + rng.normal(scale=0.01, size=(len(query_ids), vectors.shape[1])).astype(np.float32)
+
+    _, flat_ms = recall_at_k(flat_index, flat_index, queries, k)
+    print(f"Index flat      : exact baseline, {flat_ms:.3f} ms/query, {flat_index.ntotal} vectors")
+
+    for index_type in index_types:
+        if index_type == "flat":
+            continue
+        path = os.path.join(folder_path, index_filename(index_type))
+        try:
+            start = time.perf_counter()
+            index = build_index(vectors, index_type)
+            build_seconds = time.perf_counter() - start
+        except Exception as e:
+            print(f"Could not build {index_type} index: {e}")
+            continue
+        faiss.write_index(index, path)
+        recall, query_ms = recall_at_k(flat_index, configure_search(index, nprobe, ef_search), queries, k)
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+        print(f"Index {index_type:9s} built in {build_seconds:.1f}s: recall@{k}={recall:.3f} vs flat, "
+              f"{query_ms:.3f} ms/query, {size_mb:.1f} MB on disk -> {path}")